@@ -0,0 +1,35 @@
+"""
+Разовое создание таблиц БД по моделям (без Alembic)
+Запуск: python -m app.bootstrap_schema
+"""
+
+import asyncio
+import logging
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.models import Base
+
+logger = logging.getLogger(__name__)
+
+
+async def bootstrap_schema():
+    """Создает отсутствующие таблицы и индексы"""
+
+    async with engine.begin() as conn:
+        # Триграммный индекс users.username (gin_trgm_ops) требует расширения pg_trgm
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("Таблицы БД созданы/проверены")
+
+
+async def main():
+    await bootstrap_schema()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
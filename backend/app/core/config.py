@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List
 
 from pydantic import Field, PostgresDsn, RedisDsn
@@ -11,17 +12,36 @@ class Settings(BaseSettings):
 
     PROJECT_NAME: str = "MyMessenger"
     DEBUG: bool = False 
+    RUN_SCHEMA_BOOTSTRAP: bool = False      # create_all при старте (только для локальной разработки)
 
     # Безопасность
     SECRET_KEY: str = Field(..., min_length=32)
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7              
+    # Параметры argon2id для новых хешей паролей (память - в КиБ)
+    ARGON2_TIME_COST: int = Field(3, ge=1)
+    ARGON2_MEMORY_COST: int = Field(65536, ge=8192)
 
     # Подключения (валидируют формат строки)
     DATABASE_URL: str
     REDIS_URL: str
 
+    # Пул соединений с БД
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+
+    # Пул соединений с Redis (команды; Pub/Sub использует отдельное соединение)
+    REDIS_POOL_SIZE: int = 100
+
+    # Максимум одновременных рассылок из Pub/Sub
+    BROADCAST_MAX_INFLIGHT: int = 256
+
+    # Число Pub/Sub-соединений воркера (каналы распределяются по ним по хешу имени)
+    PUBSUB_SHARDS: int = 4
+
     # CORS - какие фронтенды могут подключаться
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:3000",
@@ -34,10 +54,22 @@ class Settings(BaseSettings):
         env_file_encoding="utf-8",
         case_sensitive=False,
         extra="ignore",
+        frozen=True,              # значения копируются в константы модулей при импорте
+        validate_default=False,   # дефолты заданы в коде и не требуют проверки
     )
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Настройки создаются один раз на процесс
+    Подходит и для Depends(get_settings) в эндпоинтах
+    """
+
+    return Settings()
+
+
+settings = get_settings()
 
 if __name__ == "__main__":
     print(settings.model_dump())
\ No newline at end of file
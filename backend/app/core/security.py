@@ -1,25 +1,112 @@
-from datetime import datetime, timedelta, timezone
+import asyncio
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from secrets import token_urlsafe
 from typing import Any 
-from uuid import uuid4
 
-from jose import jwt
-from passlib.context import CryptContext
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
+from jwt import encode as jwt_encode, decode as jwt_decode, PyJWTError
 
 from app.core.config import settings
 
  
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Новые пароли хешируются argon2id; старые bcrypt-хеши проверяются как раньше
+# и перехешируются в argon2id при следующем успешном логине
+_password_hasher = PasswordHasher(
+	time_cost=settings.ARGON2_TIME_COST,
+	memory_cost=settings.ARGON2_MEMORY_COST,
+)
 
 ALGORITHM = settings.ALGORITHM 
-SECRET_KEY = settings.SECRET_KEY
+ALGORITHMS = [ALGORITHM]
+SECRET_KEY = settings.SECRET_KEY.encode()
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
+
+# Обязательные claims проверяются сразу в jwt_decode; все пути (HTTP, WebSocket, refresh/logout)
+# декодируют токены одной функцией с этими опциями
+ACCESS_TOKEN_OPTIONS = {"require": ["exp", "sub", "type"]}
+REFRESH_TOKEN_OPTIONS = {"require": ["exp", "sub", "jti", "type"]}
+
+# Кеш успешных проверок пароля: повторный логин с тем же паролем не платит за bcrypt.
+# Ключ - HMAC от (хеш из БД + sha256 пароля), сам пароль в кеш не попадает
+_verify_cache: TTLCache = TTLCache(maxsize=4096, ttl=300)
+_verify_cache_lock = threading.Lock()
+
+# argon2 и bcrypt отпускают GIL, поэтому хеширование в потоках не блокирует event loop
+# и масштабируется по ядрам
+_password_executor = ThreadPoolExecutor(
+	max_workers=os.cpu_count() or 1,
+	thread_name_prefix="password-hash",
+)
+
+
+def _verify_cache_key(plain_password: str, hashed_password: str) -> bytes:
+	digest = hashlib.sha256(plain_password.encode()).digest()
+	return hmac.new(
+		SECRET_KEY,
+		hashed_password.encode() + b":" + digest,
+		hashlib.sha256,
+	).digest()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
 	"""
 	Проверка пароля пользователя при авторизации
 	Сравниваем введный пароль с хешированным в БД
+	Успешные проверки кешируются на 5 минут
+	"""
+
+	key = _verify_cache_key(plain_password, hashed_password)
+	with _verify_cache_lock:
+		if key in _verify_cache:
+			return True
+
+	if not _check_password(plain_password, hashed_password):
+		return False
+
+	with _verify_cache_lock:
+		_verify_cache[key] = True
+	return True
+
+
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+	if hashed_password.startswith("$argon2"):
+		try:
+			return _password_hasher.verify(hashed_password, plain_password)
+		except (VerificationError, InvalidHashError):
+			return False
+
+	return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+	"""Асинхронная проверка пароля в пуле потоков"""
+
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(
+		_password_executor, verify_password, plain_password, hashed_password
+	)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+	"""
+	Нужно ли перехешировать пароль (bcrypt-хеш или изменились параметры argon2)
+	Вызывается после успешного логина, пока есть открытый пароль
 	"""
 
-	return pwd_context.verify(plain_password, hashed_password)
+	if hashed_password.startswith("$2"):
+		return True
+	if hashed_password.startswith("$argon2"):
+		return _password_hasher.check_needs_rehash(hashed_password)
+	return False
 
 
 def get_password_hash(password: str) -> str:
@@ -28,46 +115,47 @@ def get_password_hash(password: str) -> str:
 	Сохраняет в БД только пароль с хеш
 	"""
 
-	return pwd_context.hash(password)
- 
+	return _password_hasher.hash(password)
+
+
+async def aget_password_hash(password: str) -> str:
+	"""Асинхронное хеширование пароля в пуле потоков"""
+
+	loop = asyncio.get_running_loop()
+	return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 
 def create_access_token(data: dict[str, Any], expires_minutes: int = 15) -> str:
 	"""
 	Создание access-токена
 	"""
 
-	to_encode = data.copy()
-
-	minutes = expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES
-	expire = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+	minutes = expires_minutes or ACCESS_TOKEN_EXPIRE_MINUTES
+	expire = int(time.time()) + minutes * 60
 
-	to_encode.update(
-		{
+	to_encode = {
+		**data,
 		"exp": expire,
-		"jti": str(uuid4()),
-		"type": "access"
-		}
-	)
+		"jti": token_urlsafe(16),
+		"type": "access",
+	}
 
-	return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+	return jwt_encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def create_refresh_token(data: dict[str, Any], expires_days: int = 7) -> tuple[str, str]:
 	"""Создание refresh-токена"""
 
-	to_encode = data.copy()
-
-	days = expires_days or settings.REFRESH_TOKEN_EXPIRE_DAYS
-	expire = datetime.utcnow() + timedelta(days=days)
+	days = expires_days or REFRESH_TOKEN_EXPIRE_DAYS
+	expire = int(time.time()) + days * 86400
 	
-	jti = str(uuid4())
-	to_encode.update(
-		{
+	jti = token_urlsafe(16)
+	to_encode = {
+		**data,
 		"exp": expire,
 		"jti": jti,
 		"type": "refresh",
-		}
-	)
+	}
 
-	token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+	token = jwt_encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 	return token, jti
\ No newline at end of file
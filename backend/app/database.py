@@ -1,22 +1,40 @@
+import asyncio
+
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from contextlib import asynccontextmanager
 from app.core.config import settings 
 
 
+# postgresql:// без драйвера поднимет синхронный psycopg2 - явно используем asyncpg
+database_url = settings.DATABASE_URL
+for prefix in ("postgresql://", "postgres://"):
+    if database_url.startswith(prefix):
+        database_url = "postgresql+asyncpg://" + database_url[len(prefix):]
+        break
+
 engine_kwargs = {
     "pool_pre_ping": True
 }
 
-if "sqlite" not in settings.DATABASE_URL:
+if database_url.startswith("postgresql+asyncpg://"):
+    engine_kwargs["connect_args"] = {
+        "statement_cache_size": 2048,              # кеш prepared statements asyncpg
+        "server_settings": {"jit": "off"},         # JIT не окупается на коротких OLTP-запросах
+    }
+
+if "sqlite" not in database_url:
     engine_kwargs.update(
         {
-            "pool_size": 5,
-            "max_overflow": 10,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_use_lifo": True,       # горячие соединения переиспользуются первыми
         }     
     )
 
 engine = create_async_engine(
-    settings.DATABASE_URL,
+    database_url,
     **engine_kwargs,
 )
 
@@ -28,6 +46,28 @@ AsyncSessionLocal = async_sessionmaker(
     autocommit=False,
 )
 
+async def warm_up_pool() -> None:
+    """
+    Открывает pool_size соединений при старте, чтобы первые запросы не ждали connect
+    """
+
+    if "sqlite" in database_url:
+        return
+
+    results = await asyncio.gather(
+        *(engine.connect() for _ in range(settings.DB_POOL_SIZE)),
+        return_exceptions=True,
+    )
+    connections = [conn for conn in results if not isinstance(conn, BaseException)]
+
+    # Закрытие возвращает соединения в пул, физически они остаются открытыми
+    await asyncio.gather(*(conn.close() for conn in connections))
+
+    errors = [err for err in results if isinstance(err, BaseException)]
+    if errors:
+        raise errors[0]
+
+
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
@@ -1,53 +1,131 @@
+import hashlib
+import logging
+import time
+from datetime import datetime
+
+from cachetools import TLRUCache
 from fastapi import Depends, HTTPException, status 
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt 
 from sqlalchemy.ext.asyncio import AsyncSession 
-from sqlalchemy import select 
+from sqlalchemy import select, bindparam
+from redis.exceptions import RedisError
 
 from app.database import get_db 
 from app.models.user import User 
-from app.core.config import settings 
+from app.core.security import SECRET_KEY, ALGORITHMS, ACCESS_TOKEN_OPTIONS, jwt_decode, PyJWTError
+from app.redis.manager import redis_manager
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
+def _credentials_exception() -> HTTPException:
+    """Новый экземпляр на каждый raise: __traceback__ не копится между запросами"""
+
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Не удалось проверить учетные данные",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+# Кеш уже проверенных access-токенов: blake2b(токен) -> (user_id, exp)
+# Запись живет до exp токена, но не дольше минуты
+TOKEN_CACHE_TTL = 60
+
+
+def _token_ttu(_key, value: tuple[int, int], now: float) -> float:
+    return min(value[1], now + TOKEN_CACHE_TTL)
+
+
+_token_cache: TLRUCache = TLRUCache(maxsize=10_000, ttu=_token_ttu, timer=time.time)
+
+# Запрос профиля строится один раз, на каждый вызов подставляется только user_id
+_user_profile_stmt = select(
+    User.id,
+    User.username,
+    User.email,
+    User.is_active,
+    User.created_at,
+).where(User.id == bindparam("user_id"))
+
+# is_active не кешируется: деактивация/удаление должны действовать сразу, а не через TTL кеша
+_user_is_active_stmt = select(User.is_active).where(User.id == bindparam("user_id"))
+
+
+async def _load_user_profile(user_id: int, db: AsyncSession) -> dict | None:
+    """
+    Профиль пользователя: сначала из Redis, при промахе - узкий SELECT из БД
+    is_active всегда читается из БД (по PK); None - пользователь удален
+    """
+
+    try:
+        profile = await redis_manager.get_cached_user_profile(user_id)
+    except RedisError as e:
+        logger.warning(f"Redis недоступен для кеша профиля: {e}")
+        profile = None
+
+    if profile is not None:
+        is_active = await db.scalar(_user_is_active_stmt, {"user_id": user_id})
+        if is_active is None:
+            return None
+
+        profile["is_active"] = is_active
+        if profile["created_at"]:
+            profile["created_at"] = datetime.fromisoformat(profile["created_at"])
+        return profile
+
+    result = await db.execute(_user_profile_stmt, {"user_id": user_id})
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    profile = row._asdict()
+    cached = {key: value for key, value in profile.items() if key != "is_active"}
+    try:
+        await redis_manager.cache_user_profile(user_id, cached)
+    except RedisError as e:
+        logger.warning(f"Redis недоступен для кеша профиля: {e}")
+
+    return profile
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db),
 ) -> User:
     """
     Dependency для HTTP эндпоинтов
-    Возвращает объект User из БД
+    Возвращает объект User (не привязан к сессии)
     """
 
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Не удалось проверить учетные данные",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(cache_key)
 
-    try:
-        payload = jwt.decode(
-        token, 
-        settings.SECRET_KEY,
-        algorithms=[settings.ALGORITHM],
-        )
-        if payload.get("type") != "access":
-            raise credentials_exception
-
-        user_id: str | None = payload.get("sub")
-        if not user_id:
-            raise credentials_exception
-        
-    except (JWTError, ValueError):
-        raise credentials_exception
-    
-    result = await db.execute(
-        select(User).where(User.id == int(user_id))
-    )
-    user = result.scalar_one_or_none()
+    if cached is not None:
+        user_id = cached[0]
+    else:
+        try:
+            payload = jwt_decode(
+            token, 
+            SECRET_KEY,
+            algorithms=ALGORITHMS,
+            options=ACCESS_TOKEN_OPTIONS,
+            )
+            if payload["type"] != "access":
+                raise _credentials_exception()
+
+            user_id = int(payload["sub"])
+            
+        except (PyJWTError, ValueError):
+            raise _credentials_exception()
 
-    if user is None or not user.is_active:
-        raise credentials_exception
+        _token_cache[cache_key] = (user_id, payload["exp"])
     
-    return user 
+    profile = await _load_user_profile(user_id, db)
+
+    if profile is None or not profile["is_active"]:
+        raise _credentials_exception()
+
+    return User(**profile) 
@@ -1,15 +1,40 @@
+import sys
+import queue
 import logging
 import asyncio
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+
+# ======== SETTINGS LOGGER ========
+# Настраивается до импорта роутеров и сервисов: записи, сделанные при импорте, тоже идут через очередь
+# Event loop только кладет записи в очередь, запись в stdout/файл - в потоке listener'а
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.StreamHandler(sys.stdout),
+    logging.FileHandler('websocket.log', delay=True),
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+
+root_logger = logging.getLogger()
+root_logger.setLevel(logging.DEBUG)
+root_logger.addHandler(QueueHandler(log_queue))
 
 from fastapi import FastAPI 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.routers import auth, users, chat, messages, websocket
+from app.routers.messages import NEXT_CURSOR_HEADER
 from app.core.config import settings
-from app.models.base import Base
-from app.database import engine 
+from app.bootstrap_schema import bootstrap_schema
+from app.database import warm_up_pool
 from app.redis.manager import redis_manager
+from app.services.delivery_batcher import delivery_batcher
 from app.websocket.manager import websocket_manager
 
 logger = logging.getLogger(__name__)
@@ -21,32 +46,44 @@ async def lifespan(app: FastAPI):
     Управление жизненным циклом приложения
     """
     
+    log_listener.start()
     logger.info("Запуск приложения...")
 
-    try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-            logger.info("Таблицы БД созданы/проверены")
+    # Схемой управляет Alembic (entrypoint.sh -> alembic upgrade head)
+    if settings.RUN_SCHEMA_BOOTSTRAP:
+        try:
+            await bootstrap_schema()
+
+        except Exception as e:
+            logger.error(f"Ошибка создания таблиц БД: {e}")
+            raise
 
+    # Пул БД прогревается заранее; ошибка не блокирует старт - соединения откроются по требованию
+    try:
+        await warm_up_pool()
+        logger.info("Пул соединений БД прогрет")
     except Exception as e:
-        logger.error(f"Ошибка создания таблиц БД: {e}")
-        raise
+        logger.warning(f"Ошибка прогрева пула БД: {e}")
 
+    # Единственный PING при старте; дальше статус обновляет run_health_checks
     try:
         await redis_manager.redis.ping()
+        redis_manager.last_ping_ok = True
         logger.info(f"Redis подключен")
     except Exception as e:
         logger.warning(f"Redis ошибка подключения: {e}")
 
-    try:
+    delivery_batcher.start()
+
+    # Ссылки на фоновые задачи держим до остановки, иначе их может собрать GC
+    background_tasks = [
+        asyncio.create_task(redis_manager.run_health_checks()),
+        asyncio.create_task(websocket_manager.connection_manager.run_presence_heartbeat()),
         asyncio.create_task(
-            redis_manager.subscribe_to_chats(
-            lambda chat_id, msg: websocket_manager.delivery_manager.broadcast_to_chat(chat_id, msg)
-            )
-        )
-        logger.info(f"Redis Pub/Sub слушатель запущен")
-    except Exception as e:
-        logger.error(f"Ошибка запуска Pub/Sub: {e}")
+            redis_manager.subscribe_to_chats(websocket_manager.delivery_manager.dispatch)
+        ),
+    ]
+    logger.info(f"Redis Pub/Sub слушатель запущен")
 
     logger.info("Приложение запущено успешно")
 
@@ -55,6 +92,15 @@ async def lifespan(app: FastAPI):
 
     logger.info("Завершение работы приложения...")
 
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    try:
+        await delivery_batcher.stop()
+    except Exception as e:
+        logger.error(f"Ошибка записи доставок при остановке: {e}")
+
     try:
         await redis_manager.close()
         logger.info("Redis соединение закрыто")
@@ -62,6 +108,7 @@ async def lifespan(app: FastAPI):
         logger.error(f"Ошибка закрытия Redis: {e}")
 
     logger.info("Приложение остановлено")
+    log_listener.stop()
 
 
 # ======== APP INIT ========
@@ -70,6 +117,7 @@ app = FastAPI(
     description="Приложение для обмена сообщениями в режиме реального времени",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,      # orjson вместо stdlib json при рендеринге ответов
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
 )
@@ -82,15 +130,13 @@ app.add_middleware(
     allow_credentials=True,                   # Разрешает куки/авторизацию 
     allow_methods=["*"],                      # Все HTTP-методы
     allow_headers=["*"],                      # Все заголовки
+    expose_headers=[NEXT_CURSOR_HEADER],      # Курсор пагинации сообщений доступен JS-клиентам
 )
 
 
 # ======== ROUTERS ========
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(chat.router)
-app.include_router(messages.router)
-app.include_router(websocket.router)
+for module in (auth, users, chat, messages, websocket):
+    app.include_router(module.router)
 
 
 # ======== HEALTH CHECK ========
@@ -99,19 +145,15 @@ async def health_check():
     """Проверка состояния сервиса"""
     import datetime 
 
-    redis_status = "отключен"
-    try:
-        await redis_manager.redis.ping()
-        redis_status = "подключен"
-    except:
-        redis_status = "ошибка"
+    # Статус Redis обновляется фоновой задачей - проба не делает I/O
+    redis_status = "подключен" if redis_manager.last_ping_ok else "ошибка"
 
     return {
         "status": "healthy",
         "service": "messenger",
         "timestamp": datetime.datetime.now().isoformat(),
         "redis": redis_status,
-        "websocket_connections": len(websocket_manager.active_connections),
+        "websocket_connections": websocket_manager.connection_manager.connection_count,
         "version": "1.0.0"
     }
 
@@ -124,18 +166,3 @@ async def root():
         "health": "/health",
         "websocket": "/ws",
     }
-
-
-# ======== SETTINGS LOGGER ========
-import sys
-import uvicorn
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('websocket.log')
-    ]
-)
-
@@ -21,7 +21,14 @@ class ChatRoom(Base):
         "User", 
         secondary="participants",   
         back_populates="chats",    
-        lazy="selectin",
+        lazy="raise",
+        passive_deletes=True,
     )
 
-    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
\ No newline at end of file
+    # Удаление сообщений и участников делает БД (ON DELETE CASCADE), без DELETE на каждую строку
+    messages = relationship(
+        "Message",
+        back_populates="chat",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
\ No newline at end of file
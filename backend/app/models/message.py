@@ -1,6 +1,4 @@
-from datetime import datetime
-
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint, Boolean, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint, Boolean, Index, desc, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func 
 
@@ -15,31 +13,40 @@ class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer, ForeignKey("chat_rooms.id"), index=True)
+    chat_id = Column(Integer, ForeignKey("chat_rooms.id", ondelete="CASCADE"))
     sender_id = Column(Integer, ForeignKey("users.id"), index=True)
-    content = Column(String(2000), nullable=False)
+    content = Column(Text, nullable=False)
     read_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_deleted = Column(Boolean, nullable=False, default=False, server_default="false")
     is_edited = Column(Boolean, nullable=False, default=False, server_default="false")
 
+    __table_args__ = (
+        # Последние N сообщений чата - без сортировки по всей выборке
+        Index("ix_messages_chat_created", "chat_id", "created_at"),
+        Index("ix_messages_chat_id_desc", "chat_id", desc("id")),
+    )
 
+    # Дочерние строки удаляет БД (ON DELETE CASCADE); passive_deletes - без их загрузки в сессию
     sender = relationship("User", back_populates="sent_messages")
     chat = relationship("ChatRoom", back_populates="messages")
     read_by_users = relationship(
         "MessageRead",
         back_populates="message",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     edits_history = relationship(
         "MessageEdit", 
         back_populates="message",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     deliveries = relationship(
         "MessageDelivery",
         back_populates="message",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -52,9 +59,9 @@ class MessageRead(Base):
     __tablename__ = "message_reads"
 
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    read_at = Column(DateTime, default=datetime.utcnow)
+    read_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     __table_args__ = (
         UniqueConstraint("message_id", "user_id", name="uix_message_user"),
@@ -73,11 +80,11 @@ class MessageEdit(Base):
     __tablename__ = "message_edits"
 
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False, index=True)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     old_content = Column(String(2000), nullable=False)
     new_content = Column(String(2000), nullable=False)
-    edited_at = Column(DateTime, default=func.now())
+    edited_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     message = relationship("Message", back_populates="edits_history")
     user = relationship("User", back_populates="edited_messages")
@@ -92,12 +99,19 @@ class MessageDelivery(Base):
     __tablename__ = "message_deliveries"
 
     id = Column(Integer, primary_key=True, index=True)
-    message_id = Column(Integer, ForeignKey("messages.id"), nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    message_id = Column(Integer, ForeignKey("messages.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     delivered_at = Column(DateTime(timezone=True), nullable=True, default=None)
 
     __table_args__ = (
         UniqueConstraint("message_id", "user_id", name="uix_message_delivery_user"),
+        # Частичный индекс: только недоставленные, после доставки строка из него уходит
+        Index(
+            "ix_deliveries_user_undelivered",
+            "user_id",
+            "delivered_at",
+            postgresql_where=text("delivered_at IS NULL"),
+        ),
     )
 
     message = relationship("Message", back_populates="deliveries")
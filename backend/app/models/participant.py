@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Table 
+from sqlalchemy import Column, Integer, ForeignKey, Table, Index
 
 from app.models.base import Base 
 
@@ -7,5 +7,7 @@ participants = Table(
     "participants",
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
-    Column("chat_id", Integer, ForeignKey("chat_rooms.id"), primary_key=True),
-)
\ No newline at end of file
+    Column("chat_id", Integer, ForeignKey("chat_rooms.id", ondelete="CASCADE"), primary_key=True),
+    # PK (user_id, chat_id) не помогает выборкам по одному chat_id (участники чата, доставки)
+    Index("ix_participants_chat_id", "chat_id"),
+)
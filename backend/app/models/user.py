@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.sql import func 
 from sqlalchemy.orm import relationship
 
@@ -19,11 +19,21 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Триграммный GIN-индекс: поиск ILIKE '%q%' идет по индексу, а не seq scan
+        Index(
+            "ix_users_username_trgm",
+            "username",
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"},
+        ),
+    )
+
     chats = relationship(
         "ChatRoom",
         secondary="participants",     
         back_populates="participants",    
-        lazy="selectin"
+        lazy="raise"
     )
 
     sent_messages = relationship("Message", back_populates="sender")
@@ -1,4 +1 @@
-from app.redis.manager import RedisManager
-
-
-redis_manager = RedisManager() 
\ No newline at end of file
+from app.redis.manager import RedisManager, redis_manager
@@ -1,66 +1,440 @@
-import json 
+import time
+import asyncio
 import logging 
-from datetime import datetime 
-
-from redis.asyncio import Redis 
+import random
+import secrets
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import msgpack
+import orjson
+import zstandard
+from cachetools import TTLCache
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.exceptions import RedisError
 from app.core.config import settings 
 
 logger = logging.getLogger(__name__)
 
+# Онлайн-отметка живет ONLINE_TTL секунд и продлевается heartbeat'ом воркера
+ONLINE_TTL = 60
+ONLINE_REFRESH_INTERVAL = 30
+
+# Сообщения крупнее порога публикуются ссылкой: тело лежит в chat:msg:{id}, в канал уходит только id
+PUBSUB_REF_THRESHOLD = 1024
+PUBSUB_BODY_TTL = 60
+
+# Список чатов пользователя кешируется на час: переподключение без запроса в БД
+USER_CHATS_TTL = 3600
+
+# Повторы публикации: экспоненциальная задержка с полным jitter (publisher'ы не ретраят синхронно)
+PUBLISH_RETRIES = 3
+PUBLISH_BACKOFF_BASE = 0.1
+PUBLISH_BACKOFF_MAX = 2.0
+# После PUBLISH_BREAKER_THRESHOLD сбоев подряд публикации сразу пропускаются на PUBLISH_BREAKER_COOL_OFF сек
+PUBLISH_BREAKER_THRESHOLD = 5
+PUBLISH_BREAKER_COOL_OFF = 5.0
+
+# Буфер чтения Pub/Sub-соединений (по умолчанию 64 КиБ): пачка сообщений читается за меньшее число recv
+PUBSUB_READ_SIZE = 256 * 1024
+
+# Тела по ссылке сжимаются zstd; кадр zstd начинается с магических байтов
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Скользящее окно rate limit атомарно на стороне Redis:
+# KEYS[1] - ключ, ARGV: граница окна и текущее время (мс), уникальный member, лимит, TTL ключа
+RATE_LIMIT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+# Забрать и удалить оффлайн-очередь одной атомарной командой
+DRAIN_LIST_LUA = """
+local messages = redis.call('LRANGE', KEYS[1], 0, -1)
+redis.call('DEL', KEYS[1])
+return messages
+"""
+
+
+# Ключи горячих семейств строятся один раз на id: lru_cache быстрее f-строки
+# в циклах по участникам чата (are_users_online, refresh_online)
+@lru_cache(maxsize=4096)
+def _k_online(user_id: int) -> str:
+    return f"online:{user_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_chat_members(chat_id: int) -> str:
+    return f"chat_members:{chat_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_chat_channel(chat_id: int) -> str:
+    return f"chat:{chat_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_user_chats(user_id: int) -> str:
+    return f"user_chats:{user_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_offline(user_id: int) -> str:
+    return f"offline:{user_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_ratelimit(user_id: int) -> str:
+    return f"ratelimit:msg:{user_id}"
+
+
+@lru_cache(maxsize=4096)
+def _k_profile(user_id: int) -> str:
+    return f"user_profile:{user_id}"
+
+
+class _AutoPipeline:
+    """
+    Авто-пайплайн: одиночные команды, поставленные конкурентными корутинами
+    за одну итерацию event loop, уходят в Redis одним pipeline (одна запись в сокет)
+    """
+
+    def __init__(self, redis: Redis):
+        self._redis = redis
+        self._pending: list[tuple[str, tuple, asyncio.Future]] = []
+        self._flush_task: asyncio.Task | None = None
+
+    def __call__(self, command: str, *args) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((command, args, future))
+
+        # Сброс запускается следующей итерацией loop - к этому моменту
+        # команды остальных готовых корутин уже в очереди
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush())
+        return future
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        self._flush_task = None
+
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for command, args, _ in batch:
+                    getattr(pipe, command)(*args)
+                replies = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), reply in zip(batch, replies):
+            if future.done():
+                continue
+            if isinstance(reply, Exception):
+                future.set_exception(reply)
+            else:
+                future.set_result(reply)
+
 
 class RedisManager:
     """Redis-менеджер для чата"""
 
-    def __init__(self):
-        self.redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    def __init__(
+        self,
+        serializer: str = "msgpack",
+        max_connections: int = settings.REDIS_POOL_SIZE,
+        pubsub_shards: int = settings.PUBSUB_SHARDS,
+    ):
+        # Формат Pub/Sub-сообщений: msgpack (по умолчанию) или json - для отладки через redis-cli
+        if serializer not in ("msgpack", "json"):
+            raise ValueError("UNKNOWN_SERIALIZER")
+        self.serializer = serializer
+
+        # Пул для обычных команд (GET/SET/PUBLISH): при исчерпании ждем, а не открываем новые
+        # keepalive + health_check_interval: мертвое соединение обнаруживается до выдачи из пула
+        self.pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=max_connections,
+            decode_responses=True,
+            socket_keepalive=True,
+            health_check_interval=30,
+        )
+        self.redis = Redis(connection_pool=self.pool)
+        # Горячие одиночные команды (SETEX/SADD/PUBLISH) - через авто-пайплайн
+        self._auto = _AutoPipeline(self.redis)
+
+        # Отдельный клиент под Pub/Sub и чтение тел сообщений (байты без декодирования - под msgpack)
+        self.pubsub_redis = Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=False,
+            socket_keepalive=True,
+            health_check_interval=30,
+            socket_read_size=PUBSUB_READ_SIZE,
+        )
+
+        # EVALSHA с автоматическим SCRIPT LOAD при NOSCRIPT
+        self._rate_limit_script = self.redis.register_script(RATE_LIMIT_LUA)
+        self._drain_list_script = self.redis.register_script(DRAIN_LIST_LUA)
+
+        self._zstd_compressor = zstandard.ZstdCompressor(level=3)
+        self._zstd_decompressor = zstandard.ZstdDecompressor()
+
+        # Тела сообщений, опубликованных этим воркером ссылкой - свой подписчик не идет за ними в Redis
+        self._published_bodies: TTLCache = TTLCache(maxsize=1024, ttl=PUBSUB_BODY_TTL)
+
+        # Подписка только на каналы чатов с локальными участниками (счетчик ссылок)
+        # и на user:{id} локальных пользователей - для вступлений в чаты.
+        # Каналы разложены по pubsub_shards соединениям (crc32 имени): у каждого свой слушатель,
+        # и медленное сообщение одного чата (тело по ссылке) не задерживает остальные.
+        # Порядок внутри канала сохраняется - канал всегда читается одним слушателем
+        self._pubsubs = [
+            self.pubsub_redis.pubsub(ignore_subscribe_messages=True)
+            for _ in range(max(1, pubsub_shards))
+        ]
+        self._channel_refs: Counter[str] = Counter()
+        # Лок только на SUBSCRIBE/UNSUBSCRIBE: PubSub лениво открывает соединение, и два
+        # одновременных первых вызова открыли бы два. Учет в словарях идет без лока (один event loop)
+        self._pubsub_locks = [asyncio.Lock() for _ in self._pubsubs]
+        self._local_users: dict[int, set[int]] = {}
+        # Обратный индекс chat_id -> локальные пользователи: кандидаты на доставку без SMEMBERS
+        self._chat_local_users: dict[int, set[int]] = {}
+
+        # Circuit breaker публикаций: число сбоев подряд и момент (monotonic), до которого он открыт
+        self._publish_failures = 0
+        self._publish_open_until = 0.0
+
+        # Результат последнего фонового PING (читает /health)
+        self.last_ping_ok = False
 
 
     # ===== ОНЛАЙН СТАТУС =====
 
     async def mark_user_online(self, user_id: int):
-        """Отмечаем пользователя онлайн (TTL 90 сек)"""
+        """Отмечаем пользователя онлайн (TTL ONLINE_TTL сек)"""
+
+        key = _k_online(user_id)
+        await self._auto("setex", key, ONLINE_TTL, "1")
 
-        key = f"online:{user_id}"
-        await self.redis.setex(key, 90, "1")
+
+    async def refresh_online(self, user_ids: list[int]):
+        """Продлеваем онлайн-отметки всех подключенных пользователей одним pipeline"""
+
+        if not user_ids:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.setex(_k_online(user_id), ONLINE_TTL, "1")
+            await pipe.execute()
 
   
     async def mark_user_offline(self, user_id: int):
         """Удаляем отметку оффлайн"""
 
-        key = f"online:{user_id}"
+        key = _k_online(user_id)
         await self.redis.delete(key)
 
   
     async def is_user_online(self, user_id: int) -> bool:
         """Проверка онлайн-статуса"""
 
-        key = f"online:{user_id}"
+        key = _k_online(user_id)
         return bool(await self.redis.exists(key))
+
+
+    async def are_users_online(self, user_ids: list[int]) -> list[bool]:
+        """Онлайн-статус нескольких пользователей одной командой MGET"""
+
+        if not user_ids:
+            return []
+
+        values = await self.redis.mget([_k_online(user_id) for user_id in user_ids])
+        return [value is not None for value in values]
   
 
     # ===== ДОБАВИТЬ / УДАЛИТЬ ИЗ ЧАТА =====
 
     async def add_user_to_chat(self, user_id: int, chat_id: int):
-        """Добавляем пользователя в набор участников чата"""
+        """
+        Добавляем пользователя в набор участников чата
+        и сообщаем воркеру, где он подключен, что нужно подписаться на новый чат
+        """
+
+        key = _k_chat_members(chat_id)
+        await asyncio.gather(
+            self._auto("sadd", key, str(user_id)),
+            # Кеш списка чатов сбрасываем - следующее подключение перечитает его из БД
+            self._auto("delete", _k_user_chats(user_id)),
+            self._auto("publish", _k_user_channel(user_id), self._pack({"_join": chat_id})),
+        )
+
+
+    async def add_user_to_chats(self, user_id: int, chat_ids: list[int]):
+        """
+        Добавляем пользователя во все его чаты и кешируем их список
+        Одна транзакция MULTI/EXEC: кеш не окажется записанным наполовину
+        """
+
+        if not chat_ids:
+            return
+
+        cache_key = _k_user_chats(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for chat_id in chat_ids:
+                pipe.sadd(_k_chat_members(chat_id), str(user_id))
+            pipe.delete(cache_key)
+            pipe.sadd(cache_key, *chat_ids)
+            pipe.expire(cache_key, USER_CHATS_TTL)
+            await pipe.execute()
+
+
+    async def get_user_chat_ids(self, user_id: int) -> list[int] | None:
+        """Кешированный список чатов пользователя; None - кеша нет"""
 
-        key = f"chat_members:{chat_id}"
-        await self.redis.sadd(key, str(user_id))
+        chat_ids = await self.redis.smembers(_k_user_chats(user_id))
+        if not chat_ids:
+            return None
+        return [int(chat_id) for chat_id in chat_ids]
+
+  
+    async def filter_chat_members(self, chat_id: int, user_ids: list[int]) -> list[int]:
+        """
+        Оставляет из user_ids только участников чата - одной командой SMISMEMBER:
+        передаются только интересующие id, а не весь набор, как при SMEMBERS
+        """
+
+        if not user_ids:
+            return []
+
+        flags = await self.redis.smismember(
+            _k_chat_members(chat_id), [str(user_id) for user_id in user_ids]
+        )
+        return [user_id for user_id, is_member in zip(user_ids, flags) if is_member]
 
   
     async def remove_user_from_chat(self, user_id: int, chat_id: int):
         """Удаляем пользователя из чата"""
 
-        key = f"chat_members:{chat_id}"
-        await self.redis.delete(key, str(user_id))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.srem(_k_chat_members(chat_id), str(user_id))
+            pipe.delete(_k_user_chats(user_id))
+            await pipe.execute()
   
 
     # ===== ПУБЛИКАЦИЯ СООБЩЕНИЙ В ЧАТЕ =====
 
-    async def publish_to_chat(self, chat_id: int, message: dict):
-        """Публикуем сообщение в канал чата"""
+    async def publish_to_chat(self, chat_id: int, message: dict) -> bool:
+        """
+        Публикуем сообщение в канал чата и кладем его в оффлайн-очереди
+        Сбой Redis не пробрасывается: сообщение уже в БД и придет с историей чата.
+        Возвращает False, если доставить через Redis не удалось
+        """
+
+        if time.monotonic() < self._publish_open_until:
+            logger.warning(f"Публикация в chat {chat_id} пропущена: Redis недоступен")
+            return False
+
+        for attempt in range(PUBLISH_RETRIES):
+            try:
+                await self._publish(chat_id, message)
+                break
+            except RedisError as e:
+                self._publish_failures += 1
+                if self._publish_failures >= PUBLISH_BREAKER_THRESHOLD:
+                    self._publish_open_until = time.monotonic() + PUBLISH_BREAKER_COOL_OFF
+                    logger.error(f"Публикации приостановлены на {PUBLISH_BREAKER_COOL_OFF} сек: {e}")
+                    return False
+                if attempt == PUBLISH_RETRIES - 1:
+                    logger.error(f"Не удалось опубликовать сообщение в chat {chat_id}: {e}")
+                    return False
+                await asyncio.sleep(
+                    random.uniform(0, min(PUBLISH_BACKOFF_BASE * 2 ** attempt, PUBLISH_BACKOFF_MAX))
+                )
+
+        self._publish_failures = 0
+
+        # Канал получают только воркеры с подключенными участниками,
+        # поэтому оффлайн-очереди пополняет публикующий - ровно один раз
+        try:
+            await self.store_for_offline_members(chat_id, message)
+        except RedisError as e:
+            logger.error(f"Не удалось сохранить оффлайн-копии для chat {chat_id}: {e}")
+            return False
+        return True
+
+
+    async def _publish(self, chat_id: int, message: dict):
+        """Крупное сообщение с id сохраняется один раз, подписчикам уходит конверт {"_ref": id}"""
+
+        channel = _k_chat_channel(chat_id)
+        payload = self._pack(message)
+
+        if len(payload) <= PUBSUB_REF_THRESHOLD or "id" not in message:
+            await self._auto("publish", channel, payload)
+        else:
+            message_id = message["id"]
+            self._published_bodies[message_id] = message
+
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.setex(
+                    f"chat:msg:{message_id}",
+                    PUBSUB_BODY_TTL,
+                    self._zstd_compressor.compress(payload),
+                )
+                pipe.publish(channel, self._pack({"_ref": message_id}))
+                await pipe.execute()
+
+
+    async def _resolve_ref(self, data: dict) -> dict | None:
+        """Конверт-ссылку заменяем телом сообщения (локально или из Redis)"""
 
-        channel = f"chat:{chat_id}"
-        await self.redis.publish(channel, json.dumps(message))
+        if "_ref" not in data:
+            return data
+
+        message_id = data["_ref"]
+        body = self._published_bodies.get(message_id)
+        if body is not None:
+            return body
+
+        # Бинарный клиент: тело в формате Pub/Sub, без декодирования в str
+        raw = await self.pubsub_redis.get(f"chat:msg:{message_id}")
+        if not raw:
+            return None
+        if raw.startswith(ZSTD_MAGIC):
+            raw = self._zstd_decompressor.decompress(raw)
+        return self._unpack(raw)
+
+
+    def _pack(self, message: dict) -> bytes:
+        if self.serializer == "json":
+            return orjson.dumps(message)
+        return msgpack.packb(message, use_bin_type=True)
+
+
+    @staticmethod
+    def _unpack(data: bytes) -> dict:
+        """
+        Формат определяется по первому байту: JSON-объект начинается с '{',
+        msgpack-словарь - нет. Воркеры с разными serializer понимают друг друга
+        """
+
+        if data[:1] == b"{":
+            return orjson.loads(data)
+        return msgpack.unpackb(data, raw=False)
 
 
     # ===== ОФФЛАЙН - СООБЩЕНИЯ =====
@@ -68,41 +442,184 @@ class RedisManager:
     async def store_offline_message(self, user_id: int, message: dict):
         """Добавляем сообщение в очередь оффлайн"""
 
-        key = f"offline:{user_id}"
-        await self.redis.rpush(key, json.dumps(message))
-        # Ограничиваем размер очереди
-        await self.redis.ltrim(key, -300, -1)                         # Храним максимум 300 последних
+        key = _k_offline(user_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, orjson.dumps(message))
+            # Ограничиваем размер очереди
+            pipe.ltrim(key, -300, -1)                                 # Храним максимум 300 последних
+            await pipe.execute()
+
+
+
+    async def store_for_offline_members(self, chat_id: int, message: dict):
+        """Кладем сообщение в оффлайн-очереди всех участников чата без онлайн-отметки"""
+
+        user_ids = []
+        for raw_id in await self.redis.smembers(_k_chat_members(chat_id)):
+            try:
+                user_ids.append(int(raw_id))
+            except ValueError:
+                continue
+
+        online_flags = await self.are_users_online(user_ids)
+        offline_ids = [uid for uid, online in zip(user_ids, online_flags) if not online]
+        if not offline_ids:
+            return
+
+        data = orjson.dumps(message)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in offline_ids:
+                key = _k_offline(user_id)
+                pipe.rpush(key, data)
+                pipe.ltrim(key, -300, -1)
+            await pipe.execute()
 
   
-    async def get_and_remove_offline_messages(self, user_id: int) -> list[dict]:
-        """Получаем и сразу удаляем все отложенные сообщения"""
-
-        key = f"offline:{user_id}"
-        messages = await self.redis.lrange(key, 0, -1)
-        if messages:
-            await self.redis.delete(key)
-        return [json.loads(m) for m in messages]
+    async def get_and_remove_offline_messages(
+        self,
+        user_id: int,
+        decode: bool = True,
+    ) -> list[dict] | list[str]:
+        """
+        Получаем и сразу удаляем все отложенные сообщения
+        decode=False - сырые JSON-строки, для отправки в сокет без повторной сериализации
+        """
+
+        key = _k_offline(user_id)
+        # Атомарно: сообщение, пришедшее между LRANGE и DEL, не потеряется
+        messages = await self._drain_list_script(keys=[key])
+
+        if not decode:
+            return messages
+        return [orjson.loads(m) for m in messages]
   
 
     # ===== PUB / SUB СЛУШАТЕЛЬ =====
 
+    async def subscribe_local_user(self, user_id: int, chat_ids: list[int]):
+        """Подписываем воркер на каналы чатов подключенного к нему пользователя"""
+
+        chats = set(chat_ids)
+        previous = self._local_users.get(user_id)
+        self._local_users[user_id] = chats
+        self._index_chats(user_id, chats - (previous or set()))
+        self._unindex_chats(user_id, (previous or set()) - chats)
+
+        if previous is None:
+            await self._retain_channels(
+                [_k_user_channel(user_id), *(_k_chat_channel(c) for c in chats)]
+            )
+            return
+
+        await self._retain_channels([_k_chat_channel(c) for c in chats - previous])
+        await self._release_channels([_k_chat_channel(c) for c in previous - chats])
+
+
+    async def unsubscribe_local_user(self, user_id: int):
+        """Пользователь отключился: отписываемся от чатов, где больше нет локальных участников"""
+
+        chats = self._local_users.pop(user_id, None)
+        if chats is None:
+            return
+        self._unindex_chats(user_id, chats)
+
+        await self._release_channels(
+            [_k_user_channel(user_id), *(_k_chat_channel(c) for c in chats)]
+        )
+
+
+    def local_chat_members(self, chat_id: int) -> list[int]:
+        """Пользователи этого воркера, состоящие в чате (по данным на момент подключения)"""
+
+        return list(self._chat_local_users.get(chat_id, ()))
+
+
+    def _index_chats(self, user_id: int, chat_ids: set[int]):
+        for chat_id in chat_ids:
+            self._chat_local_users.setdefault(chat_id, set()).add(user_id)
+
+
+    def _unindex_chats(self, user_id: int, chat_ids: set[int]):
+        for chat_id in chat_ids:
+            users = self._chat_local_users.get(chat_id)
+            if users is None:
+                continue
+            users.discard(user_id)
+            if not users:
+                del self._chat_local_users[chat_id]
+
+
+    def _shard(self, channel: str) -> int:
+        return zlib.crc32(channel.encode()) % len(self._pubsubs)
+
+
+    def _group_by_shard(self, channels: list[str]) -> dict[int, list[str]]:
+        groups: dict[int, list[str]] = {}
+        for channel in channels:
+            groups.setdefault(self._shard(channel), []).append(channel)
+        return groups
+
+
+    async def _retain_channels(self, channels: list[str]):
+        new_channels = [ch for ch in channels if self._channel_refs[ch] == 0]
+        self._channel_refs.update(channels)
+        # Одна команда SUBSCRIBE на шард
+        for shard, group in self._group_by_shard(new_channels).items():
+            async with self._pubsub_locks[shard]:
+                await self._pubsubs[shard].subscribe(*group)
+
+
+    async def _release_channels(self, channels: list[str]):
+        self._channel_refs.subtract(channels)
+        unused = [ch for ch in set(channels) if self._channel_refs[ch] <= 0]
+        for ch in unused:
+            del self._channel_refs[ch]
+        for shard, group in self._group_by_shard(unused).items():
+            async with self._pubsub_locks[shard]:
+                await self._pubsubs[shard].unsubscribe(*group)
+
+
     async def subscribe_to_chats(self, callback):
         """
-        Запускаем Pub/Sub слушатель
+        Запускаем Pub/Sub слушатели - по одному на шард
         callback вызывается для каждого полученного сообщения
         """
 
-        pubsub = self.redis.pubsub()
-        await pubsub.psubscribe("chat:*")
+        await asyncio.gather(*(self._listen(pubsub, callback) for pubsub in self._pubsubs))
+
 
-        async for message in pubsub.listen():
-            if message["type"] != "pmessage":
-                continue 
+    async def _listen(self, pubsub, callback):
+        try:
+            while True:
+                # Пока нет ни одной подписки - читать нечего (соединение еще не открыто)
+                if not pubsub.subscribed:
+                    await asyncio.sleep(1.0)
+                    continue
+
+                # get_message без async-генератора listen(); таймаут - чтобы цикл не зависал навсегда
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+
+                await self._handle_pubsub_message(message, callback)
+        finally:
+            await pubsub.aclose()
+
+
+    async def _handle_pubsub_message(self, message: dict, callback):
+        """Разбор сообщения из канала chat:{id} (или user:{id}) и передача в callback"""
 
         try:
-            channel = message["channel"]        # chat:123
-            chat_id = int(channel.split(":", 1)[1])
-            data = json.loads(message["data"])
+            prefix, raw_id = message["channel"].split(b":", 1)        # b"chat:123"
+            if prefix == b"user":
+                await self._handle_chat_join(int(raw_id), self._unpack(message["data"]))
+                return
+
+            chat_id = int(raw_id)
+            data = await self._resolve_ref(self._unpack(message["data"]))
+            if data is None:
+                logger.warning(f"Тело сообщения для chat {chat_id} истекло до доставки")
+                return
 
             await callback(chat_id, data)
 
@@ -110,36 +627,53 @@ class RedisManager:
             logger.error(f"Pub/Sub ошибка: {e}", exc_info=True)
 
 
+    async def _handle_chat_join(self, user_id: int, data: dict):
+        """Локальный пользователь добавлен в чат - подписываемся на его канал"""
+
+        chats = self._local_users.get(user_id)
+        chat_id = data.get("_join")
+        if chats is None or chat_id is None or chat_id in chats:
+            return
+
+        chats.add(chat_id)
+        self._index_chats(user_id, {chat_id})
+        await self._retain_channels([_k_chat_channel(chat_id)])
+
+
     # ===== RATE LIMITING =====
     async def rate_limiting_check(self, user_id: int, max_requests: int = 5, window_sec: int = 10) -> bool:
-        key = f"ratelimit:msg:{user_id}"
-        now = int(datetime.utcnow().timestamp())
+        """Один EVALSHA: очистка окна, подсчет и запись без гонки между параллельными проверками"""
+
+        key = _k_ratelimit(user_id)
+        # Целые миллисекунды: без float -> str при сериализации аргументов и точные score в ZSET
+        now_ms = time.time_ns() // 1_000_000
+        # Уникальный member: несколько сообщений в одну миллисекунду - разные записи
+        member = f"{now_ms}:{secrets.token_hex(4)}"
 
-        await self.redis.zremrangebyscore(key, "-inf", now - window_sec)
-        count = await self.redis.zcard(key)
-        if count >= max_requests:
-            return False 
-    
-        await self.redis.zadd(key, {str(now): now})
-        await self.redis.expire(key, window_sec + 10)
-    
-        return True 
+        allowed = await self._rate_limit_script(
+            keys=[key],
+            args=[now_ms - window_sec * 1000, now_ms, member, max_requests, window_sec + 10],
+        )
+        return bool(allowed)
 
 
     # ===== REFRESH - ТОКЕН =====
 
     async def add_refresh_token(self, jti: str, user_id: int, expires_seconds: int):
-        """Сохраняем refresh-токен"""
+        """Сохраняем refresh-токен (NX: повторная запись того же jti ничего не меняет)"""
 
         key = f"refresh_jti:{jti}"
-        await self.redis.set(key, user_id, ex=expires_seconds)
+        await self.redis.set(key, user_id, ex=expires_seconds, nx=True)
 
 
-    async def is_refresh_token_valid(self, jti: str) -> bool:
-        """Проверяем, что refresh-токен еще валиден"""
+    async def consume_refresh_token(self, jti: str) -> str | None:
+        """
+        Атомарно забираем refresh-токен (GETDEL): проверка и отзыв за один запрос.
+        Возвращает user_id владельца или None, если токен уже отозван/истек
+        """
 
         key = f"refresh_jti:{jti}"
-        return await self.redis.exists(key)
+        return await self.redis.getdel(key)
   
 
     async def revoke_refresh_token(self, jti: str):
@@ -149,10 +683,48 @@ class RedisManager:
         await self.redis.delete(key)
 
 
+    # ===== ПРОФИЛЬ ПОЛЬЗОВАТЕЛЯ =====
+
+    async def cache_user_profile(self, user_id: int, profile: dict, ttl: int = 300):
+        """Кешируем профиль пользователя (TTL 5 минут)"""
+
+        key = _k_profile(user_id)
+        await self.redis.set(key, orjson.dumps(profile), ex=ttl)
+
+
+    async def get_cached_user_profile(self, user_id: int) -> dict | None:
+        """Профиль пользователя из кеша или None"""
+
+        key = _k_profile(user_id)
+        raw = await self.redis.get(key)
+        return orjson.loads(raw) if raw else None
+
+
+    # ===== HEALTH CHECK =====
+    async def run_health_checks(self, interval: float = 5.0):
+        """
+        Фоновый PING по соединению из пула
+        /health читает last_ping_ok и не ходит в Redis на каждую пробу
+        Первый PING делает lifespan при старте, поэтому цикл начинается с паузы
+        """
+
+        while True:
+            await asyncio.sleep(interval)
+
+            try:
+                self.last_ping_ok = bool(await self.redis.ping())
+            except Exception as e:
+                if self.last_ping_ok:
+                    logger.warning(f"Redis не отвечает: {e}")
+                self.last_ping_ok = False
+
+
     # ===== ЗАКРЫТИЕ =====
 
     async def close(self):
-        await self.redis.close()
+        await self.pubsub_redis.aclose()
+        await self.redis.aclose()
+        await self.pool.aclose()
 
 
 redis_manager = RedisManager()
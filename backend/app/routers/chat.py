@@ -56,7 +56,7 @@ async def get_user_chats(
 
 @router.get("/search", response_model=List[UserResponse])
 async def search_users(
-	q: str = Query(..., min_length=2, description="Поиск пользователя"),
+	q: str = Query(..., min_length=3, description="Поиск пользователя"),
 	current_user: User = Depends(get_current_user),
 	db: AsyncSession = Depends(get_db),
 	limit: int = Query(20, ge=1, le=100)
@@ -1,6 +1,7 @@
 from typing import List 
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession 
 
 from app.database import get_db 
@@ -12,6 +13,11 @@ from app.redis.manager import redis_manager
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+# Собирается один раз: список сообщений валидируется и сериализуется в JSON целиком в pydantic-core
+_message_list = TypeAdapter(List[MessageResponse])
+
+NEXT_CURSOR_HEADER = "X-Next-Before-Id"
+
 @router.post("/", response_model=MessageResponse)
 async def send_message(
     request: MessageCreate,
@@ -38,21 +44,50 @@ async def send_message(
         )
 
 
-@router.get("/", response_model=List[MessageResponse])
+@router.get(
+    "/",
+    response_model=List[MessageResponse],
+    responses={
+        200: {
+            "headers": {
+                NEXT_CURSOR_HEADER: {
+                    "description": "before_id для следующей страницы; отсутствует на последней странице",
+                    "schema": {"type": "integer"},
+                },
+            },
+        },
+    },
+)
 async def get_messages(
     chat_id: int = Query(..., gt=0),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    before_id: int | None = Query(None, gt=0, description="Курсор: сообщения старше этого id"),
+    offset: int = Query(
+        0,
+        ge=0,
+        deprecated=True,
+        description="Устарело: используйте before_id из заголовка X-Next-Before-Id",
+    ),
 ):
-    """Получение сообщений"""
+    """
+    Получение сообщений
+    Курсор следующей страницы - в заголовке X-Next-Before-Id
+    """
+
+    if offset and before_id is not None:
+        raise HTTPException(
+            status_code=422,
+            detail="offset нельзя совмещать с before_id"
+        )
 
     try:  
-        return await MessageService.get_chat_messages(
+        messages = await MessageService.get_chat_messages(
             chat_id=chat_id,
             user_id=current_user.id,
             limit=limit,
+            before_id=before_id,
             offset=offset,
             db=db,
         )
@@ -62,6 +97,21 @@ async def get_messages(
                 status_code=403,
                 detail="Вы не являетесь участником чата"
             )
+        raise
+
+    # Готовый Response минует поэлементную обработку response_model; схема остается для OpenAPI
+    validated = _message_list.validate_python(messages, from_attributes=True)
+
+    # Неполная страница - дальше сообщений нет
+    headers = {}
+    if len(validated) == limit:
+        headers[NEXT_CURSOR_HEADER] = str(validated[-1].id)
+
+    return Response(
+        content=_message_list.dump_json(validated),
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.delete("/{message_id}/delete", status_code=204)
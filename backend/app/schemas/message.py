@@ -2,11 +2,13 @@ from datetime import datetime
 
 from pydantic import BaseModel, ConfigDict, Field, field_serializer
 
+# Колонка messages.content - TEXT, лимит длины держит приложение
+MESSAGE_MAX_LENGTH = 2000
 
 class MessageBase(BaseModel):
     """Базовая схема сообщения"""
 
-    content: str = Field(min_length=1, max_length=2000)
+    content: str = Field(min_length=1, max_length=MESSAGE_MAX_LENGTH)
     chat_id: int = Field(gt=0)
 
 
@@ -19,7 +21,7 @@ class MessageCreate(MessageBase):
 class MessageEdit(BaseModel):
     """Схема изменения сообщения"""
 
-    content: str = Field(min_length=1, max_length=2000)
+    content: str = Field(min_length=1, max_length=MESSAGE_MAX_LENGTH)
 
 
 class MessageResponse(MessageBase):
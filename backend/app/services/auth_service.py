@@ -1,18 +1,22 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
-from jose import jwt, JWTError
+from sqlalchemy import select, exists, or_
 
 from app.schemas.user import UserCreate, LoginForm
 from app.schemas.token import TokenResponse, RefreshTokenRequest
 from app.models.user import User 
 from app.redis.manager import redis_manager
 from app.core.security import (
-  get_password_hash, 
-  verify_password, 
+  aget_password_hash, 
+  averify_password, 
+  password_needs_rehash,
   create_access_token, 
-  create_refresh_token
+  create_refresh_token,
+  SECRET_KEY,
+  ALGORITHMS,
+  REFRESH_TOKEN_OPTIONS,
+  jwt_decode,
+  PyJWTError,
 )
-from app.core.config import settings
 
 
 class AuthService:
@@ -21,20 +25,23 @@ class AuthService:
     async def register(user_data: UserCreate, db: AsyncSession) -> TokenResponse:
         """Регистрация нового пользователя"""
 
-        stmt = select(User).where(
-            or_(
-                User.username == user_data.username,
-                User.email == user_data.email,
+        # EXISTS вместо загрузки строк: ответ берется из уникальных индексов, и два разных
+        # пользователя (один с таким username, другой с таким email) не ломают проверку
+        stmt = select(
+            exists().where(
+                or_(
+                    User.username == user_data.username,
+                    User.email == user_data.email,
+                )
             )
         )
-        result = await db.execute(stmt)
-        if result.scalar_one_or_none():
+        if await db.scalar(stmt):
             raise ValueError("USER_EXISTS")
 
         user = User(
             username=user_data.username,
             email=user_data.email,
-            hashed_password=get_password_hash(user_data.password),
+            hashed_password=await aget_password_hash(user_data.password),
         )
         db.add(user)
         await db.commit()
@@ -70,8 +77,12 @@ class AuthService:
         result = await db.execute(stmt)
         user = result.scalar_one_or_none()
 
-        if not user or not verify_password(form.password, user.hashed_password):
+        if not user or not await averify_password(form.password, user.hashed_password):
             raise ValueError("INVALID_CREDENTIALS")
+
+        if password_needs_rehash(user.hashed_password):
+            user.hashed_password = await aget_password_hash(form.password)
+            await db.commit()
     
         payload = {"sub": str(user.id)}
         access = create_access_token(payload)
@@ -90,28 +101,26 @@ class AuthService:
         """Обновление access-токена по refresh-токену"""
 
         try: 
-            payload = jwt.decode(
+            payload = jwt_decode(
                 data.refresh_token,
-                settings.SECRET_KEY,
-                algorithms=[settings.ALGORITHM]
+                SECRET_KEY,
+                algorithms=ALGORITHMS,
+                options=REFRESH_TOKEN_OPTIONS,
             )
-        except JWTError:
+        except PyJWTError:
             raise ValueError("INVALID_REFRESH")
     
-        if payload.get("type") != "refresh":
+        if payload["type"] != "refresh":
             raise ValueError("INVALID_REFRESH")
     
-        jti = payload.get("jti")
-        user_id: str = payload.get("sub")
-
-        if not jti or not user_id:
-            raise ValueError("INVALID_REFRESH")
+        jti = payload["jti"]
+        user_id: str = payload["sub"]
     
-        if not await redis_manager.is_refresh_token_valid(jti):
+        # GETDEL вместо EXISTS + DEL: один запрос, и два параллельных refresh
+        # с одним токеном не пройдут проверку оба
+        if await redis_manager.consume_refresh_token(jti) is None:
             raise ValueError("REFRESH_REVOKED")
     
-        await redis_manager.revoke_refresh_token(jti)
-    
         result = await db.execute(
             select(User).where(User.id == int(user_id))
         )
@@ -140,26 +149,23 @@ class AuthService:
         """Выход пользователя из аккаунта"""
 
         try:
-            payload = jwt.decode(
+            payload = jwt_decode(
                 refresh_token,
-                settings.SECRET_KEY,
-                algorithms=[settings.ALGORITHM],
+                SECRET_KEY,
+                algorithms=ALGORITHMS,
+                options=REFRESH_TOKEN_OPTIONS,
             )
-        except JWTError:
+        except PyJWTError:
             raise ValueError("INVALID_TOKEN")
 
-        if payload.get("type") != "refresh":
+        if payload["type"] != "refresh":
             raise ValueError("INVALID_TOKEN")
     
-        if str(current_user) != payload.get("sub"):
+        if str(current_user) != payload["sub"]:
             raise ValueError("FORBIDDEN")
     
-        jti = payload.get("jti")
-        if not jti:
-            raise ValueError("INVALID_TOKEN")
+        jti = payload["jti"]
   
-        if not await redis_manager.is_refresh_token_valid(jti):
+        if await redis_manager.consume_refresh_token(jti) is None:
             raise ValueError("ALREADY_REVOKED")
-    
-        await redis_manager.revoke_refresh_token(jti)
  
@@ -1,8 +1,10 @@
 from typing import Optional
 import logging
 
-from sqlalchemy import select, exists, func
+from sqlalchemy import select, exists
 from sqlalchemy.ext.asyncio import AsyncSession 
+from sqlalchemy.orm import selectinload, raiseload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from app.models.user import User
 from app.models.chat import ChatRoom
@@ -29,9 +31,11 @@ class ChatService:
     async def get_user_chat_ids(user_id: int, db: AsyncSession) -> list[int]:
         """Возвращает список ID чатов пользователя"""
 
+        # (user_id, chat_id) - первичный ключ: пары уникальны, DISTINCT не нужен,
+        # и запрос читает только индекс
         stmt = select(participants.c.chat_id).where(
             participants.c.user_id == user_id,
-        ).distinct()
+        )
 
         result = await db.execute(stmt)
         return result.scalars().all()
@@ -66,18 +70,25 @@ class ChatService:
         Найти существующий личный чат или создать новый
         """
 
+        if user1_id == user2_id:
+            raise ValueError("SELF_CHAT")
+
         try:
             existing_chat = await ChatService.find_private_chat(user1_id, user2_id, db)
             if existing_chat:
                 return existing_chat
       
             chat = await ChatService.create_private_chat(user1_id, user2_id, db)
-
-            return chat
     
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Ошибка создания чата: {e}")
-            return None 
+            chat = None
+
+        if chat is None:
+            raise ValueError("CHAT_CREATE_FAILED")
+        return chat
 
 
     @staticmethod 
@@ -90,13 +101,23 @@ class ChatService:
         Поиск существующего личного чата
         """
 
+        # Self-join participants: оба условия идут по PK (user_id, chat_id), без GROUP BY/HAVING
+        p1 = participants.alias("p1")
+        p2 = participants.alias("p2")
         stmt = (
-        select(ChatRoom)
-            .join(participants)
-            .where(ChatRoom.is_group == False)
-            .where(participants.c.user_id.in_([user1_id, user2_id]))
-            .group_by(ChatRoom.id)
-            .having(func.count(participants.c.user_id.distinct()) == 2)
+            select(ChatRoom)
+            # Участники подгружаются одним SELECT ... IN; любая другая ленивая загрузка -
+            # ошибка, а не скрытый запрос на каждый чат
+            .options(selectinload(ChatRoom.participants), raiseload("*"))
+            .join(p1, p1.c.chat_id == ChatRoom.id)
+            .join(p2, p2.c.chat_id == p1.c.chat_id)
+            .where(
+                p1.c.user_id == user1_id,
+                p2.c.user_id == user2_id,
+                # Чат с самим собой не считается личным чатом двух пользователей
+                p1.c.user_id != p2.c.user_id,
+                ChatRoom.is_group == False,
+            )
             .limit(1)
         )
         result = await db.execute(stmt)
@@ -111,8 +132,15 @@ class ChatService:
     ) -> Optional[ChatRoom]:
         """
         Создание нового личного чата
+        Участники выбираются одним запросом до вставки: он же проверяет, что оба
+        пользователя существуют, и дает готовый список участников для ответа
         """
 
+        result = await db.execute(select(User).where(User.id.in_([user1_id, user2_id])))
+        users = result.scalars().all()
+        if len(users) != len({user1_id, user2_id}):
+            raise ValueError("USER_NOT_FOUND")
+
         try:
             chat = ChatRoom(name=None, is_group=False)
             db.add(chat)
@@ -128,7 +156,10 @@ class ChatService:
                 )
 
             await db.commit()
-            await db.refresh(chat)
+
+            # participants объявлены lazy="raise" - проставляем уже загруженных пользователей,
+            # без повторного SELECT чата с участниками
+            set_committed_value(chat, "participants", list(users))
 
             await redis_manager.add_user_to_chat(user1_id, chat.id)
             await redis_manager.add_user_to_chat(user2_id, chat.id)
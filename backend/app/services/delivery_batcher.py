@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from contextlib import suppress
+
+from app.database import get_db_session
+from app.services.message_service import MessageService
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryBatcher:
+    """
+    Копит отметки о доставке и пишет их в БД пачками
+    Пачка уходит при наборе max_batch записей или через max_delay секунд
+    """
+
+    def __init__(self, max_batch: int = 500, max_delay: float = 0.05, retry_delay: float = 1.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+        self._pending: list[tuple[int, int]] = []
+        self._task: asyncio.Task | None = None
+
+    def add(self, message_id: int, user_id: int):
+        self._queue.put_nowait((message_id, user_id))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Останавливает фоновую задачу и дописывает все, что осталось в очереди
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        while not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+        await self._flush()
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+
+        # Пачка, не записанная с прошлой попытки, уходит повторно без ожидания новых отметок
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+        deadline = loop.time() + self.max_delay
+
+        while len(self._pending) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _flush(self):
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        try:
+            async with get_db_session() as db:
+                await MessageService.mark_delivered_many(batch, db)
+        except BaseException:
+            # Ошибка БД или отмена посреди записи: пачка возвращается и будет записана повторно
+            # (UPDATE ... WHERE delivered_at IS NULL - повтор безопасен)
+            self._pending = batch + self._pending
+            raise
+
+    async def _run(self):
+        while True:
+            await self._collect()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи доставок, повтор через {self.retry_delay} с: {e}")
+                await asyncio.sleep(self.retry_delay)
+
+
+delivery_batcher = DeliveryBatcher()
@@ -2,7 +2,7 @@ from typing import Optional
 import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession 
-from sqlalchemy import select, update, func
+from sqlalchemy import select, update, insert, func, literal, bindparam, exists
 
 from app.models.message import Message, MessageEdit, MessageDelivery
 from app.models.participant import participants
@@ -23,35 +23,49 @@ class MessageService:
     ) -> Optional[Message]:
         """
         Создание и сохранения сообщения
+        Если отправитель не участник чата - ValueError("FORBIDDEN")
         """
 
         try:
-            message = Message(
-                chat_id=chat_id,
-                sender_id=sender_id,
-                content=content,
+            # Проверка членства и вставка - один INSERT ... SELECT ... WHERE EXISTS RETURNING,
+            # без отдельного запроса в participants
+            message = await db.scalar(
+                insert(Message)
+                .from_select(
+                    ["chat_id", "sender_id", "content"],
+                    select(literal(chat_id), literal(sender_id), literal(content)).where(
+                        exists().where(
+                            participants.c.user_id == sender_id,
+                            participants.c.chat_id == chat_id,
+                        )
+                    ),
+                )
+                .returning(Message)
             )
 
-            db.add(message)             
-            await db.flush()             
-
-            participants = await ChatService().get_chat_members(chat_id, db)
-
-            for participant_id in participants:
-                if participant_id == sender_id:
-                    continue 
-
-            delivery = MessageDelivery(
-                message_id=message.id,
-                user_id=participant_id,
-                delivered_at=None,
+            if message is None:
+                raise ValueError("FORBIDDEN")
+
+            # Записи доставки создаются одним INSERT ... SELECT по участникам чата,
+            # без отдельного запроса за списком участников
+            await db.execute(
+                insert(MessageDelivery).from_select(
+                    ["message_id", "user_id"],
+                    select(literal(message.id), participants.c.user_id).where(
+                        participants.c.chat_id == chat_id,
+                        participants.c.user_id != sender_id,
+                    ),
+                )
             )
-            db.add(delivery)
 
+            # RETURNING уже вернул created_at и остальные колонки - refresh не нужен
             await db.commit()
-            await db.refresh(message)
 
             return message 
+
+        except ValueError:
+            await db.rollback()
+            raise
     
         except Exception as e:
             await db.rollback()     
@@ -66,12 +80,6 @@ class MessageService:
         content: str,
         db: AsyncSession,
     ):
-    
-        await MessageService.ensure_user_in_chat(
-            user_id=sender_id,
-            chat_id=chat_id,
-            db=db,
-        )
   
         message = await MessageService.create_message(
         chat_id=chat_id,
@@ -103,10 +111,13 @@ class MessageService:
         user_id: int,
         db: AsyncSession,
         limit: int = 50,
+        before_id: Optional[int] = None,
         offset: int = 0,
     ) -> list[Message]:
         """
         Возвращает последнее сообщение чата (с пагинацией)
+        before_id - курсор: сообщения старше указанного id
+        offset - устаревшая постраничная выдача, оставлена для старых клиентов
         """
 
         await MessageService.ensure_user_in_chat(
@@ -115,13 +126,17 @@ class MessageService:
             db=db
         )
 
+        # Keyset-пагинация: диапазон по индексу (chat_id, id DESC) вместо чтения и отбрасывания OFFSET строк
         stmt = (
             select(Message)
             .where(Message.chat_id == chat_id)
-            .order_by(Message.created_at.desc())
+            .order_by(Message.id.desc())
             .limit(limit)
-            .offset(offset)
         )
+        if before_id is not None:
+            stmt = stmt.where(Message.id < before_id)
+        if offset:
+            stmt = stmt.offset(offset)
 
         result = await db.execute(stmt)
         return result.scalars().all()    
@@ -168,6 +183,37 @@ class MessageService:
         await db.commit()
 
         return result.rowcount > 0
+
+
+    @staticmethod
+    async def mark_delivered_many(
+        deliveries: list[tuple[int, int]],
+        db: AsyncSession,
+    ) -> None:
+        """
+        Отмечает доставку пачкой: один executemany UPDATE на список (message_id, user_id)
+        """
+
+        if not deliveries:
+            return
+
+        # Core-таблица: ORM трактует UPDATE со списком параметров как bulk update по PK
+        deliveries_table = MessageDelivery.__table__
+        stmt = (
+            update(deliveries_table)
+            .where(
+                deliveries_table.c.message_id == bindparam("m_id"),
+                deliveries_table.c.user_id == bindparam("u_id"),
+                deliveries_table.c.delivered_at.is_(None),
+            )
+            .values(delivered_at=func.now())
+        )
+
+        await db.execute(
+            stmt,
+            [{"m_id": message_id, "u_id": user_id} for message_id, user_id in deliveries],
+        )
+        await db.commit()
     
 
     @staticmethod 
@@ -256,7 +302,6 @@ class MessageService:
             user_id=user_id,
             old_content=old_content,
             new_content=new_content,
-            edited_at=func.now(),
         )
         db.add(edit)
     
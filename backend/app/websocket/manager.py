@@ -2,17 +2,23 @@ import logging
 import asyncio
 from datetime import datetime 
 
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect
-from jose import jwt, JWTError
 
-from app.core.config import settings 
-from app.redis.manager import redis_manager
+from app.core.config import settings
+from app.core.security import SECRET_KEY, ALGORITHMS, ACCESS_TOKEN_OPTIONS, jwt_decode, PyJWTError
+from app.redis.manager import redis_manager, ONLINE_REFRESH_INTERVAL
 from app.services.chat_service import ChatService 
 from app.services.message_service import MessageService
+from app.services.delivery_batcher import delivery_batcher
 from app.database import get_db_session
+from app.schemas.message import MESSAGE_MAX_LENGTH
 
 logger = logging.getLogger(__name__)
 
+# Кадры WS сериализуются orjson (вместо json из send_json/receive_json Starlette)
+PING_FRAME = orjson.dumps({"type": "ping"}).decode()
+
 
 class AuthHandler:
   """Аутентификация WebSocket"""
@@ -25,13 +31,16 @@ class AuthHandler:
 
     token = token[7:].strip()
     try:
-      payload = jwt.decode(
+      payload = jwt_decode(
         token,
-        settings.SECRET_KEY,
-        algorithms=[settings.ALGORITHM]
+        SECRET_KEY,
+        algorithms=ALGORITHMS,
+        options=ACCESS_TOKEN_OPTIONS,
       )
+      if payload["type"] != "access":
+        raise ValueError("INVALID_TOKEN_TYPE")
       return int(payload["sub"])
-    except (JWTError, ValueError, KeyError):
+    except (PyJWTError, ValueError, KeyError):
       await ws.close(code=1008)
       return None 
     
@@ -47,6 +56,10 @@ class ConnectionManager:
         self.auth_handler = auth_handler
         self.membership_sync = membership_sync
         self.connections: dict[int, WebSocket] = {}
+        # Обратный индекс сокет -> пользователь: поиск при отключении за O(1), а не перебором
+        self._ws_users: dict[WebSocket, int] = {}
+        # Число активных соединений для /health - без обращения к словарю
+        self.connection_count = 0
 
 
     async def connect(self, ws: WebSocket) -> int | None: 
@@ -60,23 +73,31 @@ class ConnectionManager:
                 return None  
 
             if user_id in self.connections:
-                await self.connections[user_id].close(code=1000)
+                previous = self.connections[user_id]
+                self._ws_users.pop(previous, None)
+                await previous.close(code=1000)
+            else:
+                self.connection_count += 1
 
             self.connections[user_id] = ws
-            await self.membership_sync.sync_chat_memberships(user_id)
+            self._ws_users[ws] = user_id
+            chat_ids = await self.membership_sync.sync_chat_memberships(user_id)
+            # Подписка до онлайн-отметки: пока отметки нет, сообщения уходят в оффлайн-очередь
+            await redis_manager.subscribe_local_user(user_id, chat_ids)
             await redis_manager.mark_user_online(user_id)
 
-            await ws.send_json({
+            await ws.send_text(orjson.dumps({
                 "type": "connected",
                 "user_id": user_id,
                 "timestamp": datetime.utcnow().isoformat(),
-            })
+            }).decode())
 
             logger.info(f"Пользователь {user_id} подключен")
             return user_id
 
         except Exception as e:
-            logger.warning(f"Подключение не удалось: {e}")
+            # С трейсбеком: иначе сбой синхронизации чатов/подписки неотличим от плохого токена
+            logger.warning(f"Подключение не удалось: {e}", exc_info=True)
             await ws.close(code=1008) 
             return None 
     
@@ -86,12 +107,14 @@ class ConnectionManager:
         Удаляем соединение и отмечаем пользователя оффлайн
         """
 
-        user_id = self.find_user_by_ws(ws)
+        user_id = self._ws_users.pop(ws, None)
         if user_id is None:
             return 
         
-        self.connections.pop(user_id, None)
+        if self.connections.pop(user_id, None) is not None:
+            self.connection_count -= 1
         await redis_manager.mark_user_offline(user_id)
+        await redis_manager.unsubscribe_local_user(user_id)
 
         try:
             await ws.close(code=1000)
@@ -99,16 +122,28 @@ class ConnectionManager:
             pass
 
     
+    async def run_presence_heartbeat(self, interval: float = ONLINE_REFRESH_INTERVAL):
+        """
+        Периодически продлевает online:{user_id} для соединений этого воркера
+        Если воркер упал - отметки истекут сами через ONLINE_TTL
+        """
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await redis_manager.refresh_online(list(self.connections))
+            except Exception as e:
+                logger.warning(f"Не удалось продлить онлайн-статус: {e}")
+
+    
     def find_user_by_ws(self, ws: WebSocket) -> int | None:
-        for uid, active in self.connections.items():
-            if active == ws:
-                return uid 
-        return None 
+        return self._ws_users.get(ws)
 
   
-    async def send_to_user(self, user_id: int, payload: dict) -> bool:
+    async def send_to_user(self, user_id: int, payload: dict | str) -> bool:
         """
         Отправляет данные конкретному пользователю, если он онлайн
+        Строка считается уже сериализованным JSON и уходит как есть
         """
 
         ws = self.connections.get(user_id)
@@ -116,7 +151,9 @@ class ConnectionManager:
             return False 
         
         try:
-            await ws.send_json(payload)
+            if not isinstance(payload, str):
+                payload = orjson.dumps(payload).decode()
+            await ws.send_text(payload)
             return True 
         except Exception:
             await self.disconnect(ws)
@@ -161,10 +198,11 @@ class MessageHandler():
         try:
             while True:
                 try:
-                    data = await asyncio.wait_for(
-                    ws.receive_json(), 
+                    raw = await asyncio.wait_for(
+                    ws.receive_text(), 
                     timeout=ping_interval_sec
                     )
+                    data = orjson.loads(raw)
 
                     msg_type = data.get("type")
 
@@ -177,10 +215,10 @@ class MessageHandler():
                     elif msg_type == "edit_message":
                         await self.handle_edit_message(user_id, data)
                     else:
-                        logger.debug(f"Неизвестный тип сообщения: {msg_type}")
+                        logger.debug("Неизвестный тип сообщения: %s", msg_type)
 
                 except asyncio.TimeoutError:
-                    await ws.send_json({"type": "ping"})
+                    await ws.send_text(PING_FRAME)
                     missed += 1
                 if missed >= max_missed:
                     await self.connection_manager.disconnect(ws)
@@ -215,20 +253,29 @@ class MessageHandler():
             )
             return
 
+        if len(content) > MESSAGE_MAX_LENGTH:
+            await self.connection_manager.send_error(
+            user_id, 
+            f"Сообщение длиннее {MESSAGE_MAX_LENGTH} символов"
+            )
+            return
+
+        # Членство проверяется внутри INSERT ... WHERE EXISTS - без отдельного запроса
         async with get_db_session() as db:
-            if not await ChatService.is_user_in_chat(user_id, chat_id, db):
+            try:
+                msg = await MessageService.create_message(
+                    chat_id=chat_id,
+                    sender_id=user_id,
+                    content=content,
+                    db=db,
+                )
+            except ValueError:
                 await self.connection_manager.send_error(
                     user_id, 
-            "Вы не являетесь участников чата"
-            )
-            return 
-      
-        msg = await MessageService.create_message(
-            chat_id=chat_id,
-            sender_id=user_id,
-            content=content,
-            db=db,
-        )
+                    "Вы не являетесь участников чата"
+                )
+                return 
+
         if not msg:
             await self.connection_manager.send_error(
             user_id, 
@@ -266,7 +313,8 @@ class MessageHandler():
             reader_id=user_id,
             db=db,
             )
-            logger.debug(f"Прочитано {updated} сообщений для пользователя {user_id}")
+            # Ленивое форматирование: на горячем пути строка не собирается, если DEBUG выключен
+            logger.debug("Прочитано %s сообщений для пользователя %s", updated, user_id)
 
 
     async def handle_edit_message(self, user_id: int, data: dict):
@@ -278,7 +326,7 @@ class MessageHandler():
         new_content = data.get("content")
         chat_id = data.get("chat_id")
 
-        if not message_id or not new_content:
+        if not message_id or not new_content or len(new_content) > MESSAGE_MAX_LENGTH:
             return 
   
         async with get_db_session() as db:
@@ -289,7 +337,8 @@ class MessageHandler():
                 db=db,
             )
             if success:
-                await self.delivery_manager.broadcast_to_chat(
+                # Через Pub/Sub: правку получат участники, подключенные к другим воркерам
+                await redis_manager.publish_to_chat(
                 chat_id=chat_id,
                 message={
                     "type": "message_edited",
@@ -307,37 +356,67 @@ class DeliveryManager():
 
     def __init__(self, connection_manager: ConnectionManager):
         self.connections_manager = connection_manager
+        self._broadcast_slots = asyncio.Semaphore(settings.BROADCAST_MAX_INFLIGHT)
+        self._broadcast_tasks: set[asyncio.Task] = set()
+
+    async def dispatch(self, chat_id: int, message: dict):
+        """
+        Callback для Pub/Sub: запускает рассылку в фоне, не блокируя слушатель
+        Когда все слоты заняты - ждет, а не создает новые задачи (backpressure)
+        """
+
+        await self._broadcast_slots.acquire()
+        task = asyncio.create_task(self.broadcast_to_chat(chat_id, message))
+        self._broadcast_tasks.add(task)
+        task.add_done_callback(self._on_broadcast_done)
+
+    def _on_broadcast_done(self, task: asyncio.Task):
+        self._broadcast_tasks.discard(task)
+        self._broadcast_slots.release()
+
+        if not task.cancelled() and task.exception():
+            logger.error(f"Ошибка рассылки: {task.exception()}")
 
     async def broadcast_to_chat(self, chat_id: int, message: dict):
         """
-        Рассылает сообщение всем онлайн-участникам чата (кроме отправителя)
-        Для определения участников используем Redis set - chat_members:{chat_id}
+        Рассылает сообщение участникам чата, подключенным к этому воркеру
+        Членство проверяется по Redis set - chat_members:{chat_id}
+        Оффлайн-участникам сообщение уже положил в очередь публикующий (publish_to_chat)
         """
 
-        members_key = f"chat_members:{chat_id}"
-        member_ids = await redis_manager.redis.smembers(members_key)
-        if not member_ids:
+        # Кандидаты - только подключенные к этому воркеру (остальных доставят их подписки);
+        # членство сверяется с Redis по ним, без выгрузки всего chat_members:{chat_id}
+        connections = self.connections_manager.connections
+        candidates = [
+            uid for uid in redis_manager.local_chat_members(chat_id) if uid in connections
+        ]
+        local_ids = await redis_manager.filter_chat_members(chat_id, candidates)
+        if not local_ids:
             return 
 
-        async with get_db_session() as db:
+        # Сериализуем один раз на рассылку, а не на каждого получателя
+        payload = orjson.dumps(message).decode()
+        # return_exceptions: сбой одного получателя не обрывает рассылку остальным
+        results = await asyncio.gather(
+            *(self.connections_manager.send_to_user(uid, payload) for uid in local_ids),
+            return_exceptions=True,
+        )
+        sent_ids = [uid for uid, sent in zip(local_ids, results) if sent is True]
+        # Не смогли отправить в сокет - пользователь заберет сообщение при переподключении
+        offline_ids = [uid for uid, sent in zip(local_ids, results) if sent is not True]
 
-            for raw_id in member_ids:
-                try:
-                    user_id = int(raw_id)
-                except ValueError:
-                    continue 
-        
-            sent = await self.connections_manager.send_to_user(user_id, message)
-        
-            if sent:
-                if "id" in message:
-                    await MessageService.mark_delivered(
-                        message_id=message["id"],
-                        user_id=user_id,
-                        db=db,
-                    )
-            else:
-                await redis_manager.store_offline_message(user_id, message)
+        stored = await asyncio.gather(
+            *(redis_manager.store_offline_message(uid, message) for uid in offline_ids),
+            return_exceptions=True,
+        )
+        for uid, result in zip(offline_ids, stored):
+            if isinstance(result, Exception):
+                logger.error(f"Не удалось сохранить оффлайн-сообщение для {uid}: {result}")
+
+        # Отметки о доставке пишутся пачками в фоне, а не UPDATE на каждого получателя
+        if "id" in message:
+            for user_id in sent_ids:
+                delivery_batcher.add(message["id"], user_id)
 
 
     async def send_pending_messages(self, user_id: int, ws: WebSocket):
@@ -346,11 +425,18 @@ class DeliveryManager():
         """
 
         async with get_db_session() as db:
-            messages = await redis_manager.get_and_remove_offline_messages(user_id)
-            for msg in messages:
-                await ws.send_json(msg)
+            # В очереди уже готовый JSON - уходит в сокет как есть, разбираем только ради id
+            messages = await redis_manager.get_and_remove_offline_messages(user_id, decode=False)
+            for raw in messages:
+                await ws.send_text(raw)
+
+                # События без id (например, message_edited) отметки доставки не требуют
+                message_id = orjson.loads(raw).get("id")
+                if message_id is None:
+                    continue
+
                 await MessageService.mark_delivered(
-                    message_id=msg["id"], 
+                    message_id=message_id, 
                     user_id=user_id, 
                     db=db
                 )
@@ -361,11 +447,16 @@ class ChatMembershipSync:
     Синхронизация чатов пользователя
     """
 
-    async def sync_chat_memberships(self, user_id: int):
+    async def sync_chat_memberships(self, user_id: int) -> list[int]:
+        # Переподключение с живым кешем обходится без запроса в БД
+        chat_ids = await redis_manager.get_user_chat_ids(user_id)
+        if chat_ids is not None:
+            return chat_ids
+
         async with get_db_session() as db:
             chat_ids = await ChatService().get_user_chat_ids(user_id, db)
-        for cid in chat_ids:
-            await redis_manager.add_user_to_chat(user_id, cid)
+        await redis_manager.add_user_to_chats(user_id, chat_ids)
+        return chat_ids
 
 
 class WebSocketManager:
@@ -0,0 +1,126 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-15 22:39:54.857696
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('chat_rooms',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.Column('is_group', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_chat_rooms_id'), 'chat_rooms', ['id'], unique=False)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.Integer(), nullable=True),
+    sa.Column('sender_id', sa.Integer(), nullable=True),
+    sa.Column('content', sa.String(length=2000), nullable=False),
+    sa.Column('read_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('is_deleted', sa.Boolean(), server_default='false', nullable=False),
+    sa.Column('is_edited', sa.Boolean(), server_default='false', nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chat_rooms.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_messages_chat_id'), 'messages', ['chat_id'], unique=False)
+    op.create_index(op.f('ix_messages_id'), 'messages', ['id'], unique=False)
+    op.create_index(op.f('ix_messages_sender_id'), 'messages', ['sender_id'], unique=False)
+    op.create_table('participants',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('chat_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['chat_id'], ['chat_rooms.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'chat_id')
+    )
+    op.create_table('message_deliveries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('message_id', 'user_id', name='uix_message_delivery_user')
+    )
+    op.create_index(op.f('ix_message_deliveries_id'), 'message_deliveries', ['id'], unique=False)
+    op.create_index(op.f('ix_message_deliveries_message_id'), 'message_deliveries', ['message_id'], unique=False)
+    op.create_index(op.f('ix_message_deliveries_user_id'), 'message_deliveries', ['user_id'], unique=False)
+    op.create_table('message_edits',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('old_content', sa.String(length=2000), nullable=False),
+    sa.Column('new_content', sa.String(length=2000), nullable=False),
+    sa.Column('edited_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_message_edits_id'), 'message_edits', ['id'], unique=False)
+    op.create_index(op.f('ix_message_edits_message_id'), 'message_edits', ['message_id'], unique=False)
+    op.create_table('message_reads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('read_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('message_id', 'user_id', name='uix_message_user')
+    )
+    op.create_index(op.f('ix_message_reads_id'), 'message_reads', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_message_reads_id'), table_name='message_reads')
+    op.drop_table('message_reads')
+    op.drop_index(op.f('ix_message_edits_message_id'), table_name='message_edits')
+    op.drop_index(op.f('ix_message_edits_id'), table_name='message_edits')
+    op.drop_table('message_edits')
+    op.drop_index(op.f('ix_message_deliveries_user_id'), table_name='message_deliveries')
+    op.drop_index(op.f('ix_message_deliveries_message_id'), table_name='message_deliveries')
+    op.drop_index(op.f('ix_message_deliveries_id'), table_name='message_deliveries')
+    op.drop_table('message_deliveries')
+    op.drop_table('participants')
+    op.drop_index(op.f('ix_messages_sender_id'), table_name='messages')
+    op.drop_index(op.f('ix_messages_id'), table_name='messages')
+    op.drop_index(op.f('ix_messages_chat_id'), table_name='messages')
+    op.drop_table('messages')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_chat_rooms_id'), table_name='chat_rooms')
+    op.drop_table('chat_rooms')
@@ -0,0 +1,38 @@
+"""Message composite indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15 22:46:00.046917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index(op.f('ix_message_deliveries_message_id'), table_name='message_deliveries')
+    op.drop_index(op.f('ix_message_deliveries_user_id'), table_name='message_deliveries')
+    op.create_index('ix_deliveries_user_undelivered', 'message_deliveries', ['user_id', 'delivered_at'], unique=False, postgresql_where=sa.text('delivered_at IS NULL'))
+    op.drop_index(op.f('ix_messages_chat_id'), table_name='messages')
+    op.create_index('ix_messages_chat_created', 'messages', ['chat_id', 'created_at'], unique=False)
+    op.create_index('ix_messages_chat_id_desc', 'messages', ['chat_id', sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_chat_id_desc', table_name='messages')
+    op.drop_index('ix_messages_chat_created', table_name='messages')
+    op.create_index(op.f('ix_messages_chat_id'), 'messages', ['chat_id'], unique=False)
+    op.drop_index('ix_deliveries_user_undelivered', table_name='message_deliveries', postgresql_where=sa.text('delivered_at IS NULL'))
+    op.create_index(op.f('ix_message_deliveries_user_id'), 'message_deliveries', ['user_id'], unique=False)
+    op.create_index(op.f('ix_message_deliveries_message_id'), 'message_deliveries', ['message_id'], unique=False)
@@ -0,0 +1,55 @@
+"""Read and edit timestamps on server side
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15 22:49:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE message_reads SET read_at = CURRENT_TIMESTAMP WHERE read_at IS NULL")
+    op.execute("UPDATE message_edits SET edited_at = CURRENT_TIMESTAMP WHERE edited_at IS NULL")
+
+    with op.batch_alter_table('message_reads') as batch_op:
+        batch_op.alter_column('read_at',
+               existing_type=sa.DateTime(),
+               type_=sa.DateTime(timezone=True),
+               server_default=sa.func.now(),
+               nullable=False)
+
+    with op.batch_alter_table('message_edits') as batch_op:
+        batch_op.alter_column('edited_at',
+               existing_type=sa.DateTime(),
+               type_=sa.DateTime(timezone=True),
+               server_default=sa.func.now(),
+               nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('message_edits') as batch_op:
+        batch_op.alter_column('edited_at',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.DateTime(),
+               server_default=None,
+               nullable=True)
+
+    with op.batch_alter_table('message_reads') as batch_op:
+        batch_op.alter_column('read_at',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.DateTime(),
+               server_default=None,
+               nullable=True)
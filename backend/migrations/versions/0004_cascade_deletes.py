@@ -0,0 +1,44 @@
+"""Cascade deletes on the database side
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15 22:53:41.730554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (таблица, колонка, родительская таблица) - имена FK по умолчанию PostgreSQL: <table>_<column>_fkey
+CASCADE_FOREIGN_KEYS = [
+    ('messages', 'chat_id', 'chat_rooms'),
+    ('participants', 'chat_id', 'chat_rooms'),
+    ('message_reads', 'message_id', 'messages'),
+    ('message_edits', 'message_id', 'messages'),
+    ('message_deliveries', 'message_id', 'messages'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column, referent in CASCADE_FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column, referent in reversed(CASCADE_FOREIGN_KEYS):
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'])
@@ -0,0 +1,36 @@
+"""Message content as text
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-15 22:54:37.215839
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.alter_column('content',
+               existing_type=sa.String(length=2000),
+               type_=sa.Text(),
+               existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('messages') as batch_op:
+        batch_op.alter_column('content',
+               existing_type=sa.Text(),
+               type_=sa.String(length=2000),
+               existing_nullable=False)
@@ -0,0 +1,28 @@
+"""Participants chat_id index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-15 23:12:58.504127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_participants_chat_id', 'participants', ['chat_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_participants_chat_id', table_name='participants')
@@ -139,3 +139,24 @@ async def test_search_users_success(async_client, mocker, current_user):
 
 
 
+
+
+@pytest.mark.asyncio 
+async def test_search_users_query_too_short(async_client, mocker, current_user):
+    app.dependency_overrides[get_current_user] = lambda: current_user
+
+    mock_service = mocker.patch(
+        "app.services.chat_service.ChatService.search_users",
+        new_callable=AsyncMock,
+    )
+
+    try:
+        response = await async_client.get(
+            "/chats/search",
+            params={"q": "te"}
+        )
+
+        assert response.status_code == 422
+        mock_service.assert_not_awaited()
+    finally:
+        app.dependency_overrides = {}
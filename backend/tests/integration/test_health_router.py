@@ -0,0 +1,15 @@
+import pytest 
+
+from app.redis.manager import redis_manager
+
+
+@pytest.mark.asyncio
+async def test_health_does_not_ping_redis(async_client, mocker):
+    mocker.patch.object(redis_manager, "last_ping_ok", True)
+    ping = mocker.patch.object(redis_manager.redis, "ping")
+
+    response = await async_client.get("/health")
+
+    assert response.status_code == 200
+    assert response.json()["redis"] == "подключен"
+    ping.assert_not_called()
@@ -146,14 +146,46 @@ async def test_get_messages_success(async_client, mocker, current_user):
         assert len(data) == 2
         assert data[0]["id"] == 1
         assert data[1]["content"] == "new message"
+        assert "x-next-before-id" not in response.headers
 
         mock_service.assert_awaited_once_with(
         chat_id=1,
         user_id=current_user.id,
         limit=50,
+        before_id=None,
         offset=0,
         db=mocker.ANY
         )
+
+        response = await async_client.get(
+        "/messages/",
+        params={"chat_id": 1, "limit": 2, "before_id": 10}
+        )
+
+        assert response.headers["x-next-before-id"] == "2"
+        mock_service.assert_awaited_with(
+        chat_id=1,
+        user_id=current_user.id,
+        limit=2,
+        before_id=10,
+        offset=0,
+        db=mocker.ANY
+        )
+
+        # Устаревший offset принимается, но не вместе с курсором
+        response = await async_client.get(
+        "/messages/",
+        params={"chat_id": 1, "offset": 50}
+        )
+        assert response.status_code == 200
+        assert mock_service.await_args.kwargs["offset"] == 50
+
+        response = await async_client.get(
+        "/messages/",
+        params={"chat_id": 1, "offset": 50, "before_id": 10}
+        )
+        assert response.status_code == 422
+        assert mock_service.await_count == 3
     finally:
         app.dependency_overrides = {}
 
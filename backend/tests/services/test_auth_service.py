@@ -54,6 +54,24 @@ async def test_register_exists(async_session):
         await AuthService.register(user_data, async_session)
 
 
+@pytest.mark.asyncio 
+async def test_register_exists_username_and_email_of_different_users(async_session):
+    async_session.add_all([
+        User(username="first", email="first@mail.com", hashed_password="hash"),
+        User(username="second", email="second@mail.com", hashed_password="hash"),
+    ])
+    await async_session.commit()
+
+    user_data = UserCreate(
+        username="first",
+        email="second@mail.com",
+        password="password123"
+    )
+
+    with pytest.raises(ValueError, match="USER_EXISTS"):
+        await AuthService.register(user_data, async_session)
+
+
 @pytest.mark.asyncio 
 async def test_login_success(async_session, mocker):
     user = User(
@@ -65,7 +83,8 @@ async def test_login_success(async_session, mocker):
     await async_session.commit()
 
     mocker.patch(
-        "app.services.auth_service.verify_password",
+        "app.services.auth_service.averify_password",
+        new_callable=AsyncMock,
         return_value=True
     )
     mocker.patch(
@@ -88,6 +107,31 @@ async def test_login_success(async_session, mocker):
     assert result.access_token == "access-token"
 
 
+@pytest.mark.asyncio 
+async def test_login_rehashes_outdated_password(async_session, mocker):
+    import bcrypt
+
+    old_hash = bcrypt.hashpw(b"password123", bcrypt.gensalt(rounds=4)).decode()
+    user = User(
+        username="testuser",
+        email="testemail@mail.com",
+        hashed_password=old_hash,
+    )
+    async_session.add(user)
+    await async_session.commit()
+
+    mocker.patch(
+        "app.services.auth_service.redis_manager.add_refresh_token",
+        new_callable=AsyncMock
+    )
+
+    form = LoginForm(username="testuser", password="password123")
+    await AuthService.login(form, async_session)
+
+    assert user.hashed_password != old_hash
+    assert user.hashed_password.startswith("$argon2id$")
+
+
 @pytest.mark.asyncio 
 async def test_login_invalid_credentials(async_session, mocker):
     user = User(
@@ -99,7 +143,8 @@ async def test_login_invalid_credentials(async_session, mocker):
     await async_session.commit() 
 
     mocker.patch(
-        "app.services.auth_service.verify_password",
+        "app.services.auth_service.averify_password",
+        new_callable=AsyncMock,
         return_value=False
     )
 
@@ -120,17 +165,13 @@ async def test_refresh_token_success(async_session, mocker):
     await async_session.commit() 
 
     mocker.patch(
-        "app.services.auth_service.jwt.decode",
+        "app.services.auth_service.jwt_decode",
         return_value={"sub": str(user.id), "jti": "jti", "type": "refresh"}
     )
     mocker.patch(
-        "app.services.auth_service.redis_manager.is_refresh_token_valid",
+        "app.services.auth_service.redis_manager.consume_refresh_token",
         new_callable=AsyncMock,
-        return_value=True
-    )
-    mocker.patch(
-        "app.services.auth_service.redis_manager.revoke_refresh_token",
-        new_callable=AsyncMock
+        return_value=str(user.id)
     )
     mocker.patch(
         "app.services.auth_service.create_access_token",
@@ -154,21 +195,36 @@ async def test_refresh_token_success(async_session, mocker):
 
 
 @pytest.mark.asyncio 
-async def test_logout_success(mocker):
+async def test_refresh_token_revoked(async_session, mocker):
     mocker.patch(
-        "app.services.auth_service.jwt.decode",
+        "app.services.auth_service.jwt_decode",
         return_value={"sub": "1", "jti": "jti", "type": "refresh"}
     )
     mocker.patch(
-        "app.services.auth_service.redis_manager.is_refresh_token_valid",
+        "app.services.auth_service.redis_manager.consume_refresh_token",
         new_callable=AsyncMock,
-        return_value=True
+        return_value=None
     )
-    revoke = mocker.patch(
-        "app.services.auth_service.redis_manager.revoke_refresh_token",
-        new_callable=AsyncMock
+
+    with pytest.raises(ValueError, match="REFRESH_REVOKED"):
+        await AuthService.refresh_token(
+            data=type("obj", (), {"refresh_token": "token"})(),
+            db=async_session,
+        )
+
+
+@pytest.mark.asyncio 
+async def test_logout_success(mocker):
+    mocker.patch(
+        "app.services.auth_service.jwt_decode",
+        return_value={"sub": "1", "jti": "jti", "type": "refresh"}
+    )
+    consume = mocker.patch(
+        "app.services.auth_service.redis_manager.consume_refresh_token",
+        new_callable=AsyncMock,
+        return_value="1"
     )
 
     await AuthService.logout("token", current_user=1)
 
-    revoke.assert_awaited_once()
\ No newline at end of file
+    consume.assert_awaited_once_with("jti")
@@ -1,6 +1,7 @@
 import pytest 
 
 from sqlalchemy import insert, select 
+from sqlalchemy.exc import InvalidRequestError
 
 from app.models.chat import ChatRoom
 from app.models.participant import participants
@@ -73,6 +74,11 @@ async def test_find_or_create_private_chat_create_new(async_session):
         "app.services.chat_service.redis_manager.add_user_to_chat",
         new_callable=AsyncMock
     ) as mock_redis:
+        async_session.add_all([
+            User(id=3, username="user3", email="user3@mail.com", hashed_password="hash"),
+            User(id=4, username="user4", email="user4@mail.com", hashed_password="hash"),
+        ])
+        await async_session.commit()
     
         chat = await ChatService.find_or_create_private_chat(3, 4, async_session)
         assert chat is not None
@@ -112,12 +118,76 @@ async def test_find_private_chat(async_session):
     assert result.id == chat1.id 
 
 
+@pytest.mark.asyncio
+async def test_find_private_chat_query_count(async_session, async_engine):
+    from sqlalchemy import event
+
+    chat = ChatRoom(is_group=False)
+    async_session.add_all([
+        chat,
+        User(id=1, username="first", email="first@mail.com", hashed_password="hash"),
+        User(id=2, username="second", email="second@mail.com", hashed_password="hash"),
+    ])
+    await async_session.flush()
+    await async_session.execute(
+        insert(participants).values(
+            [
+                {"chat_id": chat.id, "user_id": 1},
+                {"chat_id": chat.id, "user_id": 2},
+            ]
+        )
+    )
+    await async_session.commit()
+    async_session.expunge_all()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        result = await ChatService.find_private_chat(1, 2, async_session)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+    # Чат + участники одним selectin-запросом
+    assert len(statements) == 2
+    assert {user.id for user in result.participants} == {1, 2}
+    with pytest.raises(InvalidRequestError):
+        result.messages
+
+
+@pytest.mark.asyncio
+async def test_find_private_chat_requires_both_users(async_session):
+    chat = ChatRoom(is_group=False)
+    async_session.add(chat)
+    await async_session.flush()
+    await async_session.execute(
+        insert(participants).values(
+            [
+                {"chat_id": chat.id, "user_id": 1},
+                {"chat_id": chat.id, "user_id": 3},
+            ]
+        )
+    )
+    await async_session.commit()
+
+    assert await ChatService.find_private_chat(1, 2, async_session) is None
+    assert await ChatService.find_private_chat(1, 1, async_session) is None
+
+
 @pytest.mark.asyncio
 async def test_create_private_chat(async_session, mocker):
     mocker.patch(
         "app.services.chat_service.redis_manager.add_user_to_chat",
         new_callable=AsyncMock,
     )
+    async_session.add_all([
+        User(id=5, username="user5", email="user5@mail.com", hashed_password="hash"),
+        User(id=6, username="user6", email="user6@mail.com", hashed_password="hash"),
+    ])
+    await async_session.commit()
 
     chat = await ChatService.create_private_chat(5, 6, async_session)
     assert chat is not None 
@@ -158,3 +228,35 @@ async def test_search_users(async_session):
     assert len(result_limited) == 1
   
 
+
+
+@pytest.mark.asyncio
+async def test_create_private_chat_loads_participants(async_session, mocker):
+    mocker.patch(
+        "app.services.chat_service.redis_manager.add_user_to_chat",
+        new_callable=AsyncMock,
+    )
+    user1 = User(username="user1", email="user1@mail.com", hashed_password="hash")
+    user2 = User(username="user2", email="user2@mail.com", hashed_password="hash")
+    async_session.add_all([user1, user2])
+    await async_session.commit()
+
+    chat = await ChatService.create_private_chat(user1.id, user2.id, async_session)
+
+    assert {user.id for user in chat.participants} == {user1.id, user2.id}
+    assert chat.created_at is not None
+    with pytest.raises(InvalidRequestError):
+        user1.chats
+
+
+@pytest.mark.asyncio
+async def test_find_or_create_private_chat_validates_users(async_session):
+    user = User(id=1, username="user1", email="user1@mail.com", hashed_password="hash")
+    async_session.add(user)
+    await async_session.commit()
+
+    with pytest.raises(ValueError, match="SELF_CHAT"):
+        await ChatService.find_or_create_private_chat(1, 1, async_session)
+
+    with pytest.raises(ValueError, match="USER_NOT_FOUND"):
+        await ChatService.find_or_create_private_chat(1, 999, async_session)
@@ -3,27 +3,26 @@ import pytest
 from sqlalchemy import select, insert
 
 from app.services.message_service import MessageService 
-from app.services.chat_service import ChatService
 from app.models.message import Message, MessageDelivery, MessageEdit
 from app.models.participant import participants
 
 @pytest.fixture 
-def mock_chat_members(mocker):
+async def chat_members(async_session):
     """
-    ChatService - внешний dependency для MessageService
+    Участники чата 1 - получатели записей доставки
     """
 
-    return mocker.patch.object(
-        ChatService,
-        "get_chat_members",
-        return_value=[1,2]
+    await async_session.execute(
+        insert(participants).values(
+            [{"chat_id": 1, "user_id": 1}, {"chat_id": 1, "user_id": 2}]
+        )
     )
 
 
 @pytest.mark.asyncio 
 async def test_create_message_success(
     async_session,
-    mock_chat_members,
+    chat_members,
 ):
   
     chat_id = 1
@@ -64,6 +63,43 @@ async def test_create_message_success(
     assert deliveries[0].delivered_at is None
 
 
+@pytest.mark.asyncio 
+async def test_create_message_deliveries_for_all_members(async_session):
+    await async_session.execute(
+        insert(participants).values(
+            [{"chat_id": 1, "user_id": user_id} for user_id in (1, 2, 3)]
+        )
+    )
+
+    message = await MessageService.create_message(
+        chat_id=1,
+        sender_id=1,
+        content="Hello group",
+        db=async_session
+    )
+
+    result = await async_session.execute(
+        select(MessageDelivery.user_id).where(
+        MessageDelivery.message_id == message.id
+        )
+    )
+    assert set(result.scalars().all()) == {2, 3}
+
+
+@pytest.mark.asyncio 
+async def test_create_message_forbidden_for_non_member(async_session, chat_members):
+    with pytest.raises(ValueError, match="FORBIDDEN"):
+        await MessageService.create_message(
+            chat_id=1,
+            sender_id=3,
+            content="Hello",
+            db=async_session
+        )
+
+    result = await async_session.execute(select(Message))
+    assert result.scalars().all() == []
+
+
 @pytest.mark.asyncio
 async def test_get_chat_messages(async_session):
     messages = [] 
@@ -85,9 +121,19 @@ async def test_get_chat_messages(async_session):
 
     result = await MessageService.get_chat_messages(chat_id=1, user_id=1, db=async_session)
     assert len(result) == 3
-    assert result[0].content == "msg 0"
+    assert result[0].content == "msg 2"
     assert result[1].content == "msg 1"
-    assert result[2].content == "msg 2"
+    assert result[2].content == "msg 0"
+
+    page = await MessageService.get_chat_messages(
+        chat_id=1, user_id=1, db=async_session, limit=2, before_id=messages[2].id
+    )
+    assert [m.content for m in page] == ["msg 1", "msg 0"]
+
+    legacy_page = await MessageService.get_chat_messages(
+        chat_id=1, user_id=1, db=async_session, limit=2, offset=1
+    )
+    assert [m.content for m in legacy_page] == ["msg 1", "msg 0"]
 
 
 @pytest.mark.asyncio 
@@ -126,6 +172,28 @@ async def test_mark_delivered(async_session):
     assert updated.delivered_at is not None 
 
 
+@pytest.mark.asyncio
+async def test_mark_delivered_many(async_session):
+    msg = Message(chat_id=1, sender_id=1, content="test")
+    async_session.add(msg)
+    await async_session.flush()
+
+    async_session.add_all([
+        MessageDelivery(message_id=msg.id, user_id=user_id, delivered_at=None)
+        for user_id in (2, 3, 4)
+    ])
+    await async_session.commit()
+
+    await MessageService.mark_delivered_many([(msg.id, 2), (msg.id, 3)], async_session)
+
+    result = await async_session.execute(
+        select(MessageDelivery.user_id).where(
+        MessageDelivery.delivered_at.is_not(None)
+        )
+    )
+    assert set(result.scalars().all()) == {2, 3}
+
+
 @pytest.mark.asyncio 
 async def test_mark_messages_as_read(async_session):
     chat_id = 1
@@ -0,0 +1,181 @@
+from unittest.mock import AsyncMock
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app.core.security import (
+    SECRET_KEY,
+    ALGORITHM,
+    create_access_token,
+    create_refresh_token,
+)
+from app.dependencies import auth
+from app.dependencies.auth import get_current_user
+from app.models.user import User
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    auth._token_cache.clear()
+    yield
+    auth._token_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def mock_profile_cache(mocker):
+    mocker.patch(
+        "app.dependencies.auth.redis_manager.get_cached_user_profile",
+        new_callable=AsyncMock,
+        return_value=None,
+    )
+    return mocker.patch(
+        "app.dependencies.auth.redis_manager.cache_user_profile",
+        new_callable=AsyncMock,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_success(async_session):
+    user = User(username="testuser", email="test@mail.com", hashed_password="hash")
+    async_session.add(user)
+    await async_session.commit()
+
+    token = create_access_token({"sub": str(user.id)})
+    current = await get_current_user(token=token, db=async_session)
+
+    assert current.id == user.id
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_uses_cached_profile(async_session, mocker):
+    async_session.add(User(id=7, username="stored", email="stored@mail.com", hashed_password="hash"))
+    await async_session.commit()
+
+    mocker.patch(
+        "app.dependencies.auth.redis_manager.get_cached_user_profile",
+        new_callable=AsyncMock,
+        return_value={
+            "id": 7,
+            "username": "cached",
+            "email": "cached@mail.com",
+            "created_at": "2026-01-01T00:00:00+00:00",
+        },
+    )
+
+    token = create_access_token({"sub": "7"})
+    current = await get_current_user(token=token, db=async_session)
+
+    assert current.id == 7
+    assert current.username == "cached"
+    assert current.is_active is True
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_does_not_cache_is_active(async_session, mock_profile_cache):
+    user = User(username="testuser", email="test@mail.com", hashed_password="hash")
+    async_session.add(user)
+    await async_session.commit()
+
+    token = create_access_token({"sub": str(user.id)})
+    await get_current_user(token=token, db=async_session)
+
+    cached_profile = mock_profile_cache.await_args.args[1]
+    assert "is_active" not in cached_profile
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_deactivated_user(async_session, mocker):
+    user = User(username="testuser", email="test@mail.com", hashed_password="hash")
+    async_session.add(user)
+    await async_session.commit()
+
+    token = create_access_token({"sub": str(user.id)})
+    current = await get_current_user(token=token, db=async_session)
+    assert current.id == user.id
+
+    # Токен и профиль уже в кешах - деактивация все равно действует сразу
+    mocker.patch(
+        "app.dependencies.auth.redis_manager.get_cached_user_profile",
+        new_callable=AsyncMock,
+        return_value={
+            "id": user.id,
+            "username": "testuser",
+            "email": "test@mail.com",
+            "created_at": None,
+        },
+    )
+    user.is_active = False
+    await async_session.commit()
+
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(token=token, db=async_session)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_deleted_user_with_cached_profile(async_session, mocker):
+    mocker.patch(
+        "app.dependencies.auth.redis_manager.get_cached_user_profile",
+        new_callable=AsyncMock,
+        return_value={
+            "id": 7,
+            "username": "cached",
+            "email": "cached@mail.com",
+            "created_at": None,
+        },
+    )
+
+    token = create_access_token({"sub": "7"})
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(token=token, db=async_session)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_caches_decoded_token(async_session, mocker):
+    user = User(username="testuser", email="test@mail.com", hashed_password="hash")
+    async_session.add(user)
+    await async_session.commit()
+
+    token = create_access_token({"sub": str(user.id)})
+    decode = mocker.spy(auth, "jwt_decode")
+
+    await get_current_user(token=token, db=async_session)
+    await get_current_user(token=token, db=async_session)
+
+    assert decode.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_rejects_refresh_token(async_session):
+    token, _ = create_refresh_token({"sub": "1"})
+
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(token=token, db=async_session)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_requires_sub(async_session):
+    token = jwt.encode(
+        {"type": "access", "exp": 9999999999},
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(token=token, db=async_session)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_raises_fresh_exception_each_time(async_session):
+    errors = []
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            await get_current_user(token="bad-token", db=async_session)
+        errors.append(exc.value)
+
+    assert errors[0] is not errors[1]
+    assert errors[0].status_code == errors[1].status_code == 401
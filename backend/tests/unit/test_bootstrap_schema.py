@@ -0,0 +1,40 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app import bootstrap_schema as module
+
+
+def _mock_engine(mocker, dialect_name):
+    conn = MagicMock()
+    conn.dialect.name = dialect_name
+    conn.execute = AsyncMock()
+    conn.run_sync = AsyncMock()
+
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    mocker.patch.object(module, "engine", engine)
+    return conn
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_schema_creates_pg_trgm_before_tables(mocker):
+    conn = _mock_engine(mocker, "postgresql")
+    calls = []
+    conn.execute.side_effect = lambda stmt: calls.append(str(stmt))
+    conn.run_sync.side_effect = lambda fn: calls.append("create_all")
+
+    await module.bootstrap_schema()
+
+    assert calls == ["CREATE EXTENSION IF NOT EXISTS pg_trgm", "create_all"]
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_schema_skips_extension_on_sqlite(mocker):
+    conn = _mock_engine(mocker, "sqlite")
+
+    await module.bootstrap_schema()
+
+    conn.execute.assert_not_awaited()
+    conn.run_sync.assert_awaited_once()
@@ -0,0 +1,353 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.redis.manager import RedisManager, redis_manager
+
+
+def mock_pipeline(mocker, results, manager=redis_manager):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results)
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=False)
+    return mocker.patch.object(manager.redis, "pipeline", return_value=pipe), pipe
+
+
+@pytest.mark.asyncio
+async def test_get_and_remove_offline_messages_single_script(mocker):
+    script = mocker.patch.object(
+        redis_manager, "_drain_list_script", new_callable=AsyncMock,
+        return_value=['{"id": 1}', '{"id": 2}'],
+    )
+
+    messages = await redis_manager.get_and_remove_offline_messages(7)
+
+    assert messages == [{"id": 1}, {"id": 2}]
+    script.assert_awaited_once_with(keys=["offline:7"])
+
+
+@pytest.mark.asyncio
+async def test_get_and_remove_offline_messages_raw(mocker):
+    mocker.patch.object(
+        redis_manager, "_drain_list_script", new_callable=AsyncMock, return_value=['{"id": 1}']
+    )
+
+    assert await redis_manager.get_and_remove_offline_messages(7, decode=False) == ['{"id": 1}']
+
+
+@pytest.mark.asyncio
+async def test_rate_limiting_check_single_script_call(mocker):
+    script = mocker.patch.object(
+        redis_manager, "_rate_limit_script", new_callable=AsyncMock, return_value=0
+    )
+
+    assert await redis_manager.rate_limiting_check(7, max_requests=5, window_sec=10) is False
+
+    script.assert_awaited_once()
+    assert script.call_args.kwargs["keys"] == ["ratelimit:msg:7"]
+    window_start, now, member, limit, ttl = script.call_args.kwargs["args"]
+    assert now - window_start == 10_000
+    assert isinstance(now, int)
+    assert (limit, ttl) == (5, 20)
+
+
+@pytest.mark.parametrize("serializer", ["msgpack", "json"])
+def test_pubsub_payload_roundtrip(serializer):
+    manager = RedisManager(serializer=serializer)
+    message = {"id": 1, "chat_id": 2, "content": "привет", "created_at": "2026-01-01T00:00:00"}
+
+    assert manager._unpack(manager._pack(message)) == message
+
+
+@pytest.mark.asyncio
+async def test_publish_large_message_by_reference(mocker):
+    manager = RedisManager()
+    mocker.patch.object(manager, "store_for_offline_members", new_callable=AsyncMock)
+    pipeline, pipe = mock_pipeline(mocker, [True, 1], manager)
+    message = {"id": 42, "chat_id": 1, "content": "x" * 2000}
+
+    await manager.publish_to_chat(1, message)
+
+    pipe.setex.assert_called_once()
+    assert pipe.setex.call_args.args[0] == "chat:msg:42"
+    channel, envelope = pipe.publish.call_args.args
+    assert channel == "chat:1"
+    assert manager._unpack(envelope) == {"_ref": 42}
+    assert await manager._resolve_ref({"_ref": 42}) == message
+
+    # Другой воркер читает сжатое тело из Redis
+    body = pipe.setex.call_args.args[2]
+    assert len(body) < len(manager._pack(message))
+    other = RedisManager()
+    mocker.patch.object(other.pubsub_redis, "get", new_callable=AsyncMock, return_value=body)
+    assert await other._resolve_ref({"_ref": 42}) == message
+
+
+@pytest.mark.asyncio
+async def test_resolve_ref_fetches_body_from_redis(mocker):
+    manager = RedisManager()
+    mocker.patch.object(
+        manager.pubsub_redis, "get", new_callable=AsyncMock,
+        return_value=manager._pack({"id": 42, "content": "hi"}),
+    )
+
+    assert await manager._resolve_ref({"_ref": 42}) == {"id": 42, "content": "hi"}
+    assert await manager._resolve_ref({"id": 1}) == {"id": 1}
+
+
+@pytest.mark.asyncio
+async def test_are_users_online_single_mget(mocker):
+    mget = mocker.patch.object(
+        redis_manager.redis, "mget", new_callable=AsyncMock, return_value=["1", None, "1"]
+    )
+
+    assert await redis_manager.are_users_online([1, 2, 3]) == [True, False, True]
+    mget.assert_awaited_once_with(["online:1", "online:2", "online:3"])
+
+
+@pytest.mark.asyncio
+async def test_auto_pipeline_batches_concurrent_commands(mocker):
+    manager = RedisManager()
+
+    mocker.patch.object(manager, "store_for_offline_members", new_callable=AsyncMock)
+    pipeline, pipe = mock_pipeline(mocker, [1, 0, 1, 1, 0, 1, 2], manager)
+
+    await asyncio.gather(
+        manager.add_user_to_chat(1, 10),
+        manager.add_user_to_chat(2, 10),
+        manager.publish_to_chat(10, {"id": 1}),
+    )
+
+    pipeline.assert_called_once_with(transaction=False)
+    assert pipe.sadd.call_count == 2
+    assert pipe.delete.call_count == 2
+    channels = [call.args[0] for call in pipe.publish.call_args_list]
+    assert sorted(channels) == ["chat:10", "user:1", "user:2"]
+
+
+@pytest.mark.asyncio
+async def test_auto_pipeline_propagates_command_errors(mocker):
+    manager = RedisManager()
+    mock_pipeline(mocker, [ValueError("WRONGTYPE")], manager)
+
+    with pytest.raises(ValueError):
+        await manager._auto("sadd", "chat_members:1", "1")
+
+
+@pytest.mark.asyncio
+async def test_handle_pubsub_message_calls_callback(mocker):
+    callback = AsyncMock()
+    message = {
+        "type": "message",
+        "channel": b"chat:5",
+        "data": redis_manager._pack({"id": 1, "content": "hi"}),
+    }
+
+    await redis_manager._handle_pubsub_message(message, callback)
+
+    callback.assert_awaited_once_with(5, {"id": 1, "content": "hi"})
+
+
+@pytest.mark.asyncio
+async def test_consume_refresh_token_single_getdel(mocker):
+    getdel = mocker.patch.object(
+        redis_manager.redis, "getdel", new_callable=AsyncMock, return_value="5"
+    )
+
+    assert await redis_manager.consume_refresh_token("abc") == "5"
+    getdel.assert_awaited_once_with("refresh_jti:abc")
+
+
+@pytest.mark.asyncio
+async def test_store_for_offline_members_only_offline(mocker):
+    manager = RedisManager()
+    mocker.patch.object(
+        manager.redis, "smembers", new_callable=AsyncMock, return_value={"1", "2", "3"}
+    )
+    mocker.patch.object(
+        manager, "are_users_online", new_callable=AsyncMock,
+        side_effect=lambda ids: [uid == 2 for uid in ids],
+    )
+    _, pipe = mock_pipeline(mocker, [], manager)
+
+    await manager.store_for_offline_members(5, {"id": 1})
+
+    pushed = sorted(call.args[0] for call in pipe.rpush.call_args_list)
+    assert pushed == ["offline:1", "offline:3"]
+
+
+@pytest.mark.asyncio
+async def test_local_user_subscriptions_are_refcounted(mocker):
+    manager = RedisManager(pubsub_shards=1)
+    subscribe = mocker.patch.object(manager._pubsubs[0], "subscribe", new_callable=AsyncMock)
+    unsubscribe = mocker.patch.object(manager._pubsubs[0], "unsubscribe", new_callable=AsyncMock)
+
+    await manager.subscribe_local_user(1, [10, 20])
+    await manager.subscribe_local_user(2, [10])
+    assert sorted(ch for call in subscribe.call_args_list for ch in call.args) == [
+        "chat:10", "chat:20", "user:1", "user:2",
+    ]
+
+    await manager.unsubscribe_local_user(1)
+    assert sorted(unsubscribe.call_args.args) == ["chat:20", "user:1"]
+
+    await manager.unsubscribe_local_user(2)
+    assert sorted(unsubscribe.call_args.args) == ["chat:10", "user:2"]
+
+
+@pytest.mark.asyncio
+async def test_join_message_subscribes_local_user_to_chat(mocker):
+    manager = RedisManager(pubsub_shards=1)
+    subscribe = mocker.patch.object(manager._pubsubs[0], "subscribe", new_callable=AsyncMock)
+    callback = AsyncMock()
+    await manager.subscribe_local_user(1, [])
+
+    await manager._handle_pubsub_message(
+        {"type": "message", "channel": b"user:1", "data": manager._pack({"_join": 30})},
+        callback,
+    )
+
+    subscribe.assert_awaited_with("chat:30")
+    callback.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_local_chat_members_follow_subscriptions(mocker):
+    manager = RedisManager(pubsub_shards=1)
+    mocker.patch.object(manager._pubsubs[0], "subscribe", new_callable=AsyncMock)
+    mocker.patch.object(manager._pubsubs[0], "unsubscribe", new_callable=AsyncMock)
+    smismember = mocker.patch.object(
+        manager.redis, "smismember", new_callable=AsyncMock, return_value=[1, 0]
+    )
+
+    await manager.subscribe_local_user(1, [10])
+    await manager.subscribe_local_user(2, [10, 20])
+    assert sorted(manager.local_chat_members(10)) == [1, 2]
+
+    assert await manager.filter_chat_members(10, [1, 2]) == [1]
+    smismember.assert_awaited_once_with("chat_members:10", ["1", "2"])
+
+    await manager.unsubscribe_local_user(2)
+    assert manager.local_chat_members(10) == [1]
+    assert manager.local_chat_members(20) == []
+
+
+@pytest.mark.asyncio
+async def test_publish_retries_with_backoff_then_opens_breaker(mocker):
+    manager = RedisManager()
+    publish = mocker.patch.object(
+        manager, "_publish", new_callable=AsyncMock, side_effect=RedisConnectionError("down")
+    )
+    store = mocker.patch.object(manager, "store_for_offline_members", new_callable=AsyncMock)
+    sleep = mocker.patch("app.redis.manager.asyncio.sleep", new_callable=AsyncMock)
+
+    assert await manager.publish_to_chat(1, {"id": 1}) is False
+    assert publish.await_count == 3
+    assert sleep.await_count == 2
+    assert all(0 <= call.args[0] <= 0.2 for call in sleep.await_args_list)
+
+    # 5-й сбой подряд открывает breaker - дальше публикации не доходят до Redis
+    assert await manager.publish_to_chat(1, {"id": 2}) is False
+    assert publish.await_count == 5
+    assert await manager.publish_to_chat(1, {"id": 3}) is False
+    assert publish.await_count == 5
+    store.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_publish_success_resets_failures(mocker):
+    manager = RedisManager()
+    mocker.patch.object(
+        manager, "_publish", new_callable=AsyncMock,
+        side_effect=[RedisConnectionError("blip"), None],
+    )
+    mocker.patch.object(manager, "store_for_offline_members", new_callable=AsyncMock)
+    mocker.patch("app.redis.manager.asyncio.sleep", new_callable=AsyncMock)
+
+    assert await manager.publish_to_chat(1, {"id": 1}) is True
+    assert manager._publish_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_subscribes_are_serialized(mocker):
+    manager = RedisManager(pubsub_shards=1)
+    active = 0
+    overlaps = []
+
+    async def subscribe(*channels):
+        nonlocal active
+        active += 1
+        overlaps.append(active)
+        await asyncio.sleep(0)
+        active -= 1
+
+    mocker.patch.object(manager._pubsubs[0], "subscribe", side_effect=subscribe)
+
+    await asyncio.gather(*(manager.subscribe_local_user(uid, [uid * 10]) for uid in range(5)))
+
+    assert max(overlaps) == 1
+    assert len(manager._channel_refs) == 10
+
+
+@pytest.mark.asyncio
+async def test_add_user_to_chats_caches_chat_list(mocker):
+    manager = RedisManager()
+    pipeline, pipe = mock_pipeline(mocker, [], manager)
+
+    await manager.add_user_to_chats(7, [1, 2])
+
+    pipeline.assert_called_once_with(transaction=True)
+    pipe.sadd.assert_any_call("chat_members:1", "7")
+    pipe.sadd.assert_any_call("user_chats:7", 1, 2)
+    pipe.expire.assert_called_once_with("user_chats:7", 3600)
+
+
+@pytest.mark.asyncio
+async def test_get_user_chat_ids_miss_returns_none(mocker):
+    manager = RedisManager()
+    mocker.patch.object(manager.redis, "smembers", new_callable=AsyncMock, return_value=set())
+    assert await manager.get_user_chat_ids(7) is None
+
+    mocker.patch.object(manager.redis, "smembers", new_callable=AsyncMock, return_value={"1", "2"})
+    assert sorted(await manager.get_user_chat_ids(7)) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_subscribe_local_user_without_chats_keeps_user_channel(mocker):
+    manager = RedisManager(pubsub_shards=1)
+    subscribe = mocker.patch.object(manager._pubsubs[0], "subscribe", new_callable=AsyncMock)
+
+    await manager.subscribe_local_user(1, [])
+
+    subscribe.assert_awaited_once_with("user:1")
+
+
+@pytest.mark.asyncio
+async def test_channels_are_spread_across_pubsub_shards(mocker):
+    manager = RedisManager(pubsub_shards=4)
+    mocks = [
+        mocker.patch.object(pubsub, "subscribe", new_callable=AsyncMock)
+        for pubsub in manager._pubsubs
+    ]
+
+    await manager.subscribe_local_user(1, list(range(1, 41)))
+
+    # Каждый шард получает одну команду, и каждый канал - ровно на своем шарде
+    subscribed = []
+    for shard, subscribe in enumerate(mocks):
+        assert subscribe.await_count <= 1
+        for call in subscribe.await_args_list:
+            assert all(manager._shard(ch) == shard for ch in call.args)
+            subscribed.extend(call.args)
+    assert len(subscribed) == 41
+    assert sum(1 for subscribe in mocks if subscribe.await_count) > 1
+
+
+def test_pubsub_client_reads_bytes_with_large_buffer():
+    manager = RedisManager()
+    kwargs = manager.pubsub_redis.connection_pool.connection_kwargs
+
+    assert kwargs["decode_responses"] is False
+    assert kwargs["socket_read_size"] == 256 * 1024
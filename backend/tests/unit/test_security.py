@@ -0,0 +1,50 @@
+import pytest
+
+from app.core import security
+from app.core.security import get_password_hash, verify_password
+
+
+@pytest.fixture(autouse=True)
+def clear_verify_cache():
+    security._verify_cache.clear()
+    yield
+    security._verify_cache.clear()
+
+
+def test_verify_password_cached(mocker):
+    hashed = get_password_hash("password123")
+    verify = mocker.spy(security, "_check_password")
+
+    assert verify_password("password123", hashed) is True
+    assert verify_password("password123", hashed) is True
+    assert verify.call_count == 1
+
+
+def test_verify_password_wrong_not_cached(mocker):
+    hashed = get_password_hash("password123")
+    verify = mocker.spy(security, "_check_password")
+
+    assert verify_password("wrong_password", hashed) is False
+    assert verify_password("wrong_password", hashed) is False
+    assert verify.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_averify_password():
+    hashed = await security.aget_password_hash("password123")
+
+    assert await security.averify_password("password123", hashed) is True
+    assert await security.averify_password("wrong_password", hashed) is False
+
+
+def test_new_hashes_use_argon2id_and_bcrypt_is_migrated():
+    import bcrypt
+
+    hashed = get_password_hash("password123")
+    assert hashed.startswith("$argon2id$")
+    assert security.password_needs_rehash(hashed) is False
+
+    legacy = bcrypt.hashpw(b"password123", bcrypt.gensalt(rounds=4)).decode()
+    assert verify_password("password123", legacy) is True
+    assert verify_password("wrong_password", legacy) is False
+    assert security.password_needs_rehash(legacy) is True
@@ -1,7 +1,16 @@
+import asyncio
+
 import pytest 
 from unittest.mock import AsyncMock, patch
 
-from app.websocket.manager import DeliveryManager
+from app.services.delivery_batcher import DeliveryBatcher
+from app.websocket.manager import (
+  AuthHandler,
+  ChatMembershipSync,
+  ConnectionManager,
+  DeliveryManager,
+  MessageHandler,
+)
 from app.main import app
 from fastapi.testclient import TestClient 
 
@@ -10,14 +19,9 @@ from fastapi.testclient import TestClient
 async def test_send_pending_messages(mocker):
   mock_ws = mocker.AsyncMock()
   mock_messages = [
-    {
-      "id": 1,
-      "content": "hello"
-    },
-    {
-      "id": 2,
-      "content": "world",
-    }
+    '{"id": 1, "content": "hello"}',
+    '{"id": 2, "content": "world"}',
+    '{"type": "message_edited", "message_id": 2}',
   ]
 
   mocker.patch(
@@ -42,6 +46,377 @@ async def test_send_pending_messages(mocker):
   manager = DeliveryManager(connection_manager=mock_conn_manager)
   await manager.send_pending_messages(user_id=1, ws=mock_ws)
 
-  assert mock_ws.send_json.call_count == 2
+  assert mock_ws.send_text.call_count == 3
+  mock_ws.send_text.assert_any_await('{"id": 1, "content": "hello"}')
   assert mock_mark.call_count == 2
-  mock_mark.assert_awaited_with(message_id=2, user_id=1, db=mock_db)
\ No newline at end of file
+  mock_mark.assert_awaited_with(message_id=2, user_id=1, db=mock_db)
+
+@pytest.mark.asyncio 
+async def test_broadcast_to_chat(mocker):
+  mocker.patch(
+    "app.redis.manager.redis_manager.local_chat_members",
+    return_value=[1, 2, 3],
+  )
+  mock_smismember = mocker.patch(
+    "app.redis.manager.redis_manager.redis.smismember",
+    new_callable=AsyncMock,
+    side_effect=lambda key, ids: [1] * len(ids),
+  )
+  mock_store = mocker.patch(
+    "app.redis.manager.redis_manager.store_offline_message",
+    new_callable=AsyncMock,
+  )
+  mock_add = mocker.patch("app.websocket.manager.delivery_batcher.add")
+
+  mock_conn_manager = mocker.MagicMock()
+  mock_conn_manager.connections = {1: mocker.AsyncMock()}
+  mock_conn_manager.send_to_user = AsyncMock(return_value=True)
+
+  message = {"id": 10, "content": "hello"}
+  manager = DeliveryManager(connection_manager=mock_conn_manager)
+  await manager.broadcast_to_chat(chat_id=1, message=message)
+
+  mock_smismember.assert_awaited_once_with("chat_members:1", ["1"])
+  mock_conn_manager.send_to_user.assert_awaited_once_with(1, '{"id":10,"content":"hello"}')
+  mock_store.assert_not_awaited()
+  mock_add.assert_called_once_with(10, 1)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_limits_inflight_broadcasts(mocker):
+  manager = DeliveryManager(connection_manager=mocker.MagicMock())
+  manager._broadcast_slots = asyncio.Semaphore(2)
+
+  release = asyncio.Event()
+  started = []
+
+  async def slow_broadcast(chat_id, message):
+    started.append(chat_id)
+    await release.wait()
+
+  manager.broadcast_to_chat = slow_broadcast
+
+  await manager.dispatch(1, {})
+  await manager.dispatch(2, {})
+  blocked = asyncio.create_task(manager.dispatch(3, {}))
+  await asyncio.sleep(0)
+
+  assert not blocked.done()
+  assert len(manager._broadcast_tasks) == 2
+
+  release.set()
+  await blocked
+  await asyncio.gather(*manager._broadcast_tasks)
+
+  assert started == [1, 2, 3]
+  assert not manager._broadcast_tasks
+
+
+@pytest.mark.asyncio
+async def test_delivery_batcher_flushes_in_batches(mocker):
+  mock_mark = mocker.patch(
+    "app.services.message_service.MessageService.mark_delivered_many",
+    new_callable=AsyncMock,
+  )
+  mock_db = mocker.AsyncMock()
+  mocker.patch(
+    "app.services.delivery_batcher.get_db_session",
+    return_value=mocker.MagicMock(__aenter__=AsyncMock(return_value=mock_db))
+  )
+
+  batcher = DeliveryBatcher(max_batch=2, max_delay=0.01)
+  batcher.start()
+  for user_id in (1, 2, 3):
+    batcher.add(10, user_id)
+  await asyncio.sleep(0.05)
+  await batcher.stop()
+
+  assert [call.args[0] for call in mock_mark.await_args_list] == [
+    [(10, 1), (10, 2)],
+    [(10, 3)],
+  ]
+
+
+@pytest.mark.asyncio
+async def test_delivery_batcher_retries_failed_batch(mocker):
+  mock_mark = mocker.patch(
+    "app.services.message_service.MessageService.mark_delivered_many",
+    new_callable=AsyncMock,
+    side_effect=[RuntimeError("db down"), None],
+  )
+  mock_db = mocker.AsyncMock()
+  mocker.patch(
+    "app.services.delivery_batcher.get_db_session",
+    return_value=mocker.MagicMock(__aenter__=AsyncMock(return_value=mock_db))
+  )
+
+  batcher = DeliveryBatcher(max_batch=10, max_delay=0.01, retry_delay=0.01)
+  batcher.start()
+  batcher.add(10, 1)
+  await asyncio.sleep(0.1)
+  await batcher.stop()
+
+  assert [call.args[0] for call in mock_mark.await_args_list] == [[(10, 1)], [(10, 1)]]
+
+
+@pytest.mark.asyncio
+async def test_delivery_batcher_stop_keeps_batch_in_flight(mocker):
+  started = asyncio.Event()
+  written = []
+
+  async def mark(batch, db):
+    if not written:
+      written.append(None)
+      started.set()
+      await asyncio.sleep(10)
+    written.append(batch)
+
+  mocker.patch(
+    "app.services.message_service.MessageService.mark_delivered_many",
+    side_effect=mark,
+  )
+  mock_db = mocker.AsyncMock()
+  mocker.patch(
+    "app.services.delivery_batcher.get_db_session",
+    return_value=mocker.MagicMock(__aenter__=AsyncMock(return_value=mock_db))
+  )
+
+  batcher = DeliveryBatcher(max_batch=10, max_delay=0.01)
+  batcher.start()
+  batcher.add(10, 1)
+  await started.wait()
+  batcher.add(10, 2)
+  await batcher.stop()
+
+  # Отмена посреди записи не теряет пачку: stop() дописывает ее вместе с остатком очереди
+  assert written[1:] == [[(10, 1), (10, 2)]]
+
+
+@pytest.mark.asyncio
+async def test_presence_heartbeat_refreshes_local_connections(mocker):
+  mock_refresh = mocker.patch(
+    "app.redis.manager.redis_manager.refresh_online",
+    new_callable=AsyncMock,
+  )
+
+  manager = ConnectionManager(
+    auth_handler=mocker.MagicMock(),
+    membership_sync=mocker.MagicMock(),
+  )
+  manager.connections = {1: mocker.AsyncMock(), 2: mocker.AsyncMock()}
+
+  task = asyncio.create_task(manager.run_presence_heartbeat(interval=0))
+  await asyncio.sleep(0.01)
+  task.cancel()
+
+  mock_refresh.assert_awaited_with([1, 2])
+
+
+@pytest.mark.asyncio
+async def test_send_to_user_sends_serialized_payload_as_text(mocker):
+  ws = mocker.AsyncMock()
+  manager = ConnectionManager(
+    auth_handler=mocker.MagicMock(),
+    membership_sync=mocker.MagicMock(),
+  )
+  manager.connections = {1: ws}
+
+  assert await manager.send_to_user(1, '{"id":1}') is True
+
+  ws.send_text.assert_awaited_once_with('{"id":1}')
+  ws.send_json.assert_not_called()
+
+  assert await manager.send_to_user(1, {"id": 2}) is True
+  ws.send_text.assert_awaited_with('{"id":2}')
+
+
+@pytest.mark.asyncio
+async def test_handle_user_message_rejects_too_long_content(mocker):
+  mocker.patch(
+    "app.redis.manager.redis_manager.rate_limiting_check",
+    new_callable=AsyncMock,
+    return_value=True,
+  )
+  mock_create = mocker.patch(
+    "app.services.message_service.MessageService.create_message",
+    new_callable=AsyncMock,
+  )
+
+  mock_conn_manager = mocker.MagicMock()
+  mock_conn_manager.send_error = AsyncMock()
+  handler = MessageHandler(
+    connection_manager=mock_conn_manager,
+    delivery_manager=mocker.MagicMock(),
+  )
+
+  await handler.handle_user_message(1, {"chat_id": 1, "content": "x" * 2001})
+
+  mock_conn_manager.send_error.assert_awaited_once()
+  mock_create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_handle_user_message_creates_and_publishes(mocker):
+  from datetime import datetime, timezone
+
+  mocker.patch(
+    "app.redis.manager.redis_manager.rate_limiting_check",
+    new_callable=AsyncMock,
+    return_value=True,
+  )
+  mock_publish = mocker.patch(
+    "app.redis.manager.redis_manager.publish_to_chat",
+    new_callable=AsyncMock,
+  )
+  mock_db = mocker.AsyncMock()
+  mocker.patch(
+    "app.websocket.manager.get_db_session",
+    return_value=mocker.MagicMock(__aenter__=AsyncMock(return_value=mock_db))
+  )
+  created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+  mock_create = mocker.patch(
+    "app.services.message_service.MessageService.create_message",
+    new_callable=AsyncMock,
+    return_value=mocker.MagicMock(id=5, created_at=created_at),
+  )
+  mock_member = mocker.patch(
+    "app.services.chat_service.ChatService.is_user_in_chat",
+    new_callable=AsyncMock,
+  )
+
+  mock_conn_manager = mocker.MagicMock()
+  mock_conn_manager.send_error = AsyncMock()
+  handler = MessageHandler(
+    connection_manager=mock_conn_manager,
+    delivery_manager=mocker.MagicMock(),
+  )
+
+  await handler.handle_user_message(1, {"chat_id": 3, "content": "hi"})
+
+  mock_member.assert_not_called()
+  mock_create.assert_awaited_once_with(chat_id=3, sender_id=1, content="hi", db=mock_db)
+  mock_publish.assert_awaited_once_with(3, {
+    "id": 5,
+    "chat_id": 3,
+    "sender_id": 1,
+    "content": "hi",
+    "created_at": created_at.isoformat(),
+  })
+  mock_conn_manager.send_error.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_connection_count_follows_connect_and_disconnect(mocker):
+  mocker.patch("app.redis.manager.redis_manager.mark_user_online", new_callable=AsyncMock)
+  mocker.patch("app.redis.manager.redis_manager.mark_user_offline", new_callable=AsyncMock)
+  mocker.patch("app.redis.manager.redis_manager.subscribe_local_user", new_callable=AsyncMock)
+  mocker.patch("app.redis.manager.redis_manager.unsubscribe_local_user", new_callable=AsyncMock)
+
+  auth_handler = mocker.MagicMock()
+  auth_handler.authenticate = AsyncMock(return_value=1)
+  membership_sync = mocker.MagicMock()
+  membership_sync.sync_chat_memberships = AsyncMock(return_value=[])
+  manager = ConnectionManager(auth_handler=auth_handler, membership_sync=membership_sync)
+
+  first_ws, second_ws = mocker.AsyncMock(), mocker.AsyncMock()
+  await manager.connect(first_ws)
+  await manager.connect(second_ws)
+  assert manager.connection_count == 1
+  assert manager.find_user_by_ws(first_ws) is None
+  assert manager.find_user_by_ws(second_ws) == 1
+
+  await manager.disconnect(first_ws)
+  assert manager.connection_count == 1
+
+  await manager.disconnect(second_ws)
+  assert manager.connection_count == 0
+  assert manager.find_user_by_ws(second_ws) is None
+
+
+@pytest.mark.asyncio
+async def test_broadcast_to_chat_isolates_failures(mocker):
+  mocker.patch(
+    "app.redis.manager.redis_manager.local_chat_members",
+    return_value=[1, 2, 3],
+  )
+  mock_smismember = mocker.patch(
+    "app.redis.manager.redis_manager.redis.smismember",
+    new_callable=AsyncMock,
+    side_effect=lambda key, ids: [1] * len(ids),
+  )
+  mock_store = mocker.patch(
+    "app.redis.manager.redis_manager.store_offline_message",
+    new_callable=AsyncMock,
+    side_effect=ConnectionError("redis down"),
+  )
+  mock_add = mocker.patch("app.websocket.manager.delivery_batcher.add")
+
+  async def send_to_user(uid, payload):
+    if uid == 2:
+      raise RuntimeError("socket closed")
+    return True
+
+  mock_conn_manager = mocker.MagicMock()
+  mock_conn_manager.connections = {1: mocker.AsyncMock(), 2: mocker.AsyncMock()}
+  mock_conn_manager.send_to_user = send_to_user
+
+  manager = DeliveryManager(connection_manager=mock_conn_manager)
+  await manager.broadcast_to_chat(chat_id=1, message={"id": 10, "content": "hello"})
+
+  mock_store.assert_awaited_once_with(2, {"id": 10, "content": "hello"})
+  mock_add.assert_called_once_with(10, 1)
+
+
+@pytest.mark.asyncio
+async def test_sync_chat_memberships_uses_cached_chat_list(mocker):
+  mocker.patch(
+    "app.redis.manager.redis_manager.get_user_chat_ids",
+    new_callable=AsyncMock,
+    return_value=[1, 2],
+  )
+  mock_session = mocker.patch("app.websocket.manager.get_db_session")
+  mock_add = mocker.patch(
+    "app.redis.manager.redis_manager.add_user_to_chats",
+    new_callable=AsyncMock,
+  )
+
+  assert await ChatMembershipSync().sync_chat_memberships(7) == [1, 2]
+
+  mock_session.assert_not_called()
+  mock_add.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_receive_loop_parses_text_frames(mocker):
+  from fastapi import WebSocketDisconnect
+
+  ws = mocker.AsyncMock()
+  ws.receive_text.side_effect = ['{"type":"read","message_ids":[1,2]}', WebSocketDisconnect()]
+  mock_conn_manager = mocker.MagicMock()
+  mock_conn_manager.find_user_by_ws.return_value = 7
+  mock_conn_manager.disconnect = AsyncMock()
+
+  handler = MessageHandler(connection_manager=mock_conn_manager, delivery_manager=mocker.MagicMock())
+  handler.handle_read_message = AsyncMock()
+
+  await handler.receive_loop(ws)
+
+  handler.handle_read_message.assert_awaited_once_with(7, {"type": "read", "message_ids": [1, 2]})
+  ws.receive_json.assert_not_called()
+  mock_conn_manager.disconnect.assert_awaited_once_with(ws)
+
+
+@pytest.mark.asyncio
+async def test_auth_handler_accepts_only_access_tokens(mocker):
+  from app.core.security import create_access_token, create_refresh_token
+
+  access_ws = mocker.AsyncMock()
+  access_ws.headers = {"authorization": f"Bearer {create_access_token({'sub': '5'})}"}
+  assert await AuthHandler().authenticate(access_ws) == 5
+  access_ws.close.assert_not_called()
+
+  refresh_token, _ = create_refresh_token({"sub": "5"})
+  refresh_ws = mocker.AsyncMock()
+  refresh_ws.headers = {"authorization": f"Bearer {refresh_token}"}
+  assert await AuthHandler().authenticate(refresh_ws) is None
+  refresh_ws.close.assert_awaited_once_with(code=1008)